@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class ChatConfig(AppConfig):
     name = 'chat'
+
+    def ready(self):
+        from core.metrics import registry
+        from .outbound import collect_metrics
+        registry.register_collector(collect_metrics)
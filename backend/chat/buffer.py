@@ -0,0 +1,108 @@
+import asyncio
+import atexit
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBuffer:
+    """
+    Per-process write-behind buffer for chat messages.
+
+    Messages are collected in memory and written with one ``bulk_create`` once
+    ``batch_size`` are pending or ``flush_ms`` after the first one arrived,
+    whichever comes first. A failed write puts the batch back and schedules
+    a retry with exponential backoff, up to ``max_retries`` times; after that
+    the rows are inserted one by one and any row that still fails is logged
+    and dropped, so one bad message can't hold up the rest forever.
+    """
+
+    def __init__(self, batch_size=100, flush_ms=200, max_retries=3):
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.max_retries = max_retries
+        self._pending = []
+        self._timer = None
+        self._failures = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def add(self, message):
+        self._pending.append(message)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            # A timer can be left done but unset if its loop closed under it.
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self, delay_ms=None):
+        await asyncio.sleep((self.flush_ms if delay_ms is None else delay_ms) / 1000)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            await database_sync_to_async(self._write)(batch)
+        except Exception:
+            self._failures += 1
+            if self._failures <= self.max_retries:
+                logger.exception('Failed to persist %d chat messages; will retry', len(batch))
+                self._pending[:0] = batch
+                # Retry on a timer, backing off, so a quiet room doesn't leave
+                # already broadcast messages unsaved until the next add().
+                backoff = self.flush_ms * 2 ** self._failures
+                self._timer = asyncio.ensure_future(self._flush_later(backoff))
+                return
+            logger.exception('Failed to persist %d chat messages; writing them one by one', len(batch))
+            await database_sync_to_async(self._write_rows)(batch)
+        self._failures = 0
+
+    def flush_sync(self):
+        """Write whatever is pending from synchronous code, e.g. at exit."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            self._write(batch)
+        except Exception:
+            logger.exception('Failed to persist %d chat messages; writing them one by one', len(batch))
+            self._write_rows(batch)
+
+    def _write(self, batch):
+        Message.objects.bulk_create(batch, batch_size=self.batch_size)
+
+    def _write_rows(self, batch):
+        for message in batch:
+            try:
+                Message.objects.bulk_create([message])
+            except Exception:
+                logger.exception('Dropping chat message for trip %s', message.trip_id)
+
+
+_buffer = None
+
+
+def get_message_buffer():
+    """The process-wide buffer, or ``None`` when write-behind is disabled."""
+    global _buffer
+    if not settings.CHAT_WRITE_BEHIND:
+        return None
+    if _buffer is None:
+        _buffer = MessageBuffer(
+            settings.CHAT_WRITE_BEHIND_BATCH_SIZE, settings.CHAT_WRITE_BEHIND_FLUSH_MS,
+            settings.CHAT_WRITE_BEHIND_MAX_RETRIES,
+        )
+        atexit.register(_buffer.flush_sync)
+    return _buffer
@@ -1,13 +1,32 @@
+import asyncio
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from core.pagination import decode_cursor, encode_cursor, keyset_filter
+from .buffer import get_message_buffer
 from .models import Message
-from trips.models import Trip
+from .outbound import OutboundQueue
+from trips.models import TripMembership
+
+HISTORY_ORDERING = ('-timestamp', '-id')
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    history_page_size = settings.CHAT_HISTORY_PAGE_SIZE
+
     async def connect(self):
-        self.trip_id = self.scope['url_route']['kwargs']['trip_id']
+        self.trip_id = int(self.scope['url_route']['kwargs']['trip_id'])
         self.room_group_name = f'chat_{self.trip_id}'
+        self.user = self.scope['user']
+
+        # Authorize once; everything after this trusts the connection.
+        self.role = await self.get_membership_role()
+        if self.role is None:
+            await self.close()
+            return
 
         # Join room group
         await self.channel_layer.group_add(
@@ -17,60 +36,148 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
-        # Send chat history
-        history = await self.get_history()
-        for msg in history:
-            await self.send(text_data=json.dumps(msg))
+        # Broadcasts go through a bounded queue so a stalled client can't
+        # make this process buffer without limit. Clients that connect with
+        # ?acks=1 also pace delivery by acknowledging frames; older clients
+        # don't, and get frames unpaced.
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.paced = query.get('acks', [''])[0] in ('1', 'true')
+        self.outbound = OutboundQueue(
+            settings.CHAT_OUTBOUND_QUEUE_SIZE, settings.CHAT_OUTBOUND_POLICY,
+            settings.CHAT_OUTBOUND_WINDOW if self.paced else None,
+        )
+        self.writer = asyncio.ensure_future(self.write_outbound())
+
+        # Send the most recent messages in a single frame
+        await self.send_history()
 
     async def disconnect(self, close_code):
+        if getattr(self, 'role', None) is None:
+            return
+        if hasattr(self, 'writer'):
+            self.writer.cancel()
+            self.outbound.close()
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
 
+        buffer = get_message_buffer()
+        if buffer is not None:
+            await buffer.flush()
+
     # Receive message from WebSocket
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
+        if text_data_json.get('command') == 'load_more':
+            await self.send_history(text_data_json.get('cursor'))
+            return
+        if text_data_json.get('command') == 'ack':
+            if not self.outbound.ack(text_data_json.get('seq')):
+                await self.send(text_data=json.dumps({'type': 'error', 'error': 'Invalid ack'}))
+            return
+
         message = text_data_json['message']
-        user = self.scope['user']
+        buffer = get_message_buffer()
 
-        if user.is_authenticated:
+        if buffer is None:
             # Save message to database
-            await self.save_message(user, message)
-
-            # Send message to room group
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': message,
-                    'user': user.email,
-                    'timestamp': 'now'
-                }
-            )
+            await self.save_message(message)
+
+        # Send message to room group
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'chat_message',
+                'message': message,
+                'user': self.user.email,
+                'timestamp': 'now'
+            }
+        )
+
+        if buffer is not None:
+            # Write-behind: persisted with the next batch
+            await buffer.add(Message(trip_id=self.trip_id, user=self.user, content=message))
 
     # Receive message from room group
     async def chat_message(self, event):
         message = event['message']
         user = event['user']
 
-        # Send message to WebSocket
+        # Queue message for the WebSocket
+        if not self.outbound.put({'message': message, 'user': user}):
+            await self.close(code=4008)
+
+    async def write_outbound(self):
+        while True:
+            frame = await self.outbound.get()
+            if self.paced:
+                frame = {**frame, 'seq': self.outbound.sent}
+            await self.send(text_data=json.dumps(frame))
+
+    async def send_history(self, cursor=None):
+        try:
+            messages, next_cursor = await self.get_history(cursor)
+        except ValueError:
+            await self.send(text_data=json.dumps({'type': 'error', 'error': 'Invalid cursor'}))
+            return
         await self.send(text_data=json.dumps({
-            'message': message,
-            'user': user
+            'type': 'history',
+            'messages': messages,
+            'cursor': next_cursor,
         }))
 
     @database_sync_to_async
-    def save_message(self, user, content):
-        trip = Trip.objects.get(id=self.trip_id)
-        return Message.objects.create(trip=trip, user=user, content=content)
+    def get_membership_role(self):
+        if not self.user.is_authenticated or not self.user.is_active:
+            return None
+        return TripMembership.objects.filter(
+            trip_id=self.trip_id, user=self.user
+        ).values_list('role', flat=True).first()
 
     @database_sync_to_async
-    def get_history(self):
-        messages = Message.objects.filter(trip_id=self.trip_id).order_by('timestamp')[:50]
+    def save_message(self, content):
+        # The trip was checked at connect, so this is a single INSERT.
+        return Message.objects.create(trip_id=self.trip_id, user=self.user, content=content)
+
+    @database_sync_to_async
+    def get_history(self, cursor=None):
+        """
+        One page of history, newest first in the query but returned oldest to
+        newest for display. The cursor points at the oldest message sent, so
+        ``load_more`` seeks straight past it on the (trip, timestamp) index.
+        """
+        queryset = Message.objects.filter(trip_id=self.trip_id).select_related('user').order_by(*HISTORY_ORDERING)
+        if cursor:
+            queryset = queryset.filter(keyset_filter(HISTORY_ORDERING, self.decode_position(cursor)))
+
+        page = list(queryset[:self.history_page_size + 1])
+        has_more = len(page) > self.history_page_size
+        page = page[:self.history_page_size]
+
+        next_cursor = None
+        if has_more:
+            oldest = page[-1]
+            next_cursor = encode_cursor([oldest.timestamp, oldest.pk])
         return [{
             'message': m.content,
             'user': m.user.email,
             'timestamp': m.timestamp.isoformat()
-        } for m in messages]
+        } for m in reversed(page)], next_cursor
+
+    @staticmethod
+    def decode_position(cursor):
+        """The (timestamp, id) a history cursor points at; raises ValueError for anything malformed."""
+        if not isinstance(cursor, str):
+            raise ValueError('Malformed cursor')
+        values = decode_cursor(cursor)
+        if len(values) != len(HISTORY_ORDERING):
+            raise ValueError('Malformed cursor')
+        try:
+            return [
+                Message._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(HISTORY_ORDERING, values)
+            ]
+        except (TypeError, ValidationError):
+            raise ValueError('Malformed cursor')
@@ -0,0 +1,145 @@
+import asyncio
+import statistics
+import time
+import tracemalloc
+from datetime import date
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from chat.consumers import ChatConsumer
+from trips.models import Trip, TripMembership
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Fan-out load test for ChatConsumer: R rooms x C clients each sending M msgs/sec, '
+        'driven through WebsocketCommunicator on the in-memory channel layer (no Redis). '
+        'Reports throughput, delivery latency and memory per connection. '
+        'Creates its own users and trips in the configured database and deletes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=5)
+        parser.add_argument('--clients', type=int, default=10, help='Sockets per room.')
+        parser.add_argument('--rate', type=float, default=2.0, help='Messages per second per client.')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds each client keeps sending.')
+        parser.add_argument('--write-behind', action='store_true', help='Persist through the write-behind buffer.')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Seconds to wait for a delivery before giving up.')
+        parser.add_argument('--capacity', type=int, default=100,
+                            help='Channel layer queue capacity per channel; overflow is dropped, as with Redis.')
+
+    def handle(self, *args, rooms, clients, rate, duration, write_behind, timeout, capacity, **kwargs):
+        users = User.objects.bulk_create([
+            User(email=f'bench-chat-{index}@example.invalid') for index in range(clients)
+        ])
+        trips = [
+            Trip.objects.create(
+                title=f'Chat fan-out {index}', destination='Nowhere', owner=users[0],
+                start_date=date.today(), end_date=date.today(),
+            )
+            for index in range(rooms)
+        ]
+        TripMembership.objects.bulk_create([
+            TripMembership(trip=trip, user=user, role='editor') for trip in trips for user in users[1:]
+        ])
+        try:
+            layers = {'default': {
+                'BACKEND': 'channels.layers.InMemoryChannelLayer',
+                'CONFIG': {'capacity': capacity},
+            }}
+            with override_settings(CHANNEL_LAYERS=layers, CHAT_WRITE_BEHIND=write_behind):
+                result = async_to_sync(self.run)(trips, users, rate, duration, timeout)
+        finally:
+            Trip.objects.filter(pk__in=[trip.pk for trip in trips]).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        connections = rooms * clients
+        sent, latencies, skipped, elapsed, memory = result
+        expected = sent * clients
+        delivered = len(latencies)
+        if not latencies:
+            raise CommandError('No messages were delivered')
+
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = (statistics.quantiles(latencies, n=100)[98] if delivered > 1 else latencies[0]) * 1000
+        self.stdout.write(f'{connections} connections ({rooms} rooms x {clients} clients), '
+                          f'{rate:g} msgs/sec each for {duration:g}s, write_behind={write_behind}')
+        self.stdout.write(f'sent={sent} delivered={delivered}/{expected} skipped={skipped} in {elapsed:.2f}s '
+                          f'({sent / elapsed:.0f} msgs/sec in, {delivered / elapsed:.0f} deliveries/sec out)')
+        self.stdout.write(f'latency p50={p50:.1f}ms p99={p99:.1f}ms')
+        self.stdout.write(f'memory per connection: {memory / connections / 1024:.1f} KiB')
+        if delivered + skipped < expected:
+            raise CommandError(f'{expected - delivered - skipped} deliveries missing')
+        self.stdout.write(self.style.SUCCESS('All messages delivered'))
+
+    async def run(self, trips, users, rate, duration, timeout):
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        rooms = []
+        for trip in trips:
+            room = []
+            for user in users:
+                communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{trip.pk}/?acks=1')
+                communicator.scope['url_route'] = {'kwargs': {'trip_id': str(trip.pk)}}
+                communicator.scope['user'] = user
+                room.append(communicator)
+            rooms.append(room)
+
+        communicators = [communicator for room in rooms for communicator in room]
+        for communicator in communicators:
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise CommandError('A benchmark socket was rejected')
+            await communicator.receive_json_from()  # history frame
+        memory = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        per_client = max(1, int(rate * duration))
+        expected_per_client = per_client * len(users)
+        latencies = []
+        skipped = []
+        # A receive timeout cancels the consumer, so those sockets are already gone.
+        timed_out = set()
+
+        async def send(communicator):
+            interval = 1 / rate
+            start = time.perf_counter()
+            for number in range(per_client):
+                await communicator.send_json_to({'message': repr(time.perf_counter())})
+                delay = start + (number + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+        async def receive(communicator):
+            remaining = expected_per_client
+            while remaining > 0:
+                try:
+                    frame = await communicator.receive_json_from(timeout=timeout)
+                except asyncio.TimeoutError:
+                    timed_out.add(communicator)
+                    return
+                await communicator.send_json_to({'command': 'ack', 'seq': frame['seq']})
+                if frame.get('type') == 'missed':
+                    # Coalesced by the outbound queue because this client fell behind.
+                    skipped.append(frame['count'])
+                    remaining -= frame['count']
+                    continue
+                latencies.append(time.perf_counter() - float(frame['message']))
+                remaining -= 1
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(send(communicator) for communicator in communicators),
+            *(receive(communicator) for communicator in communicators),
+        )
+        elapsed = time.perf_counter() - started
+
+        for communicator in communicators:
+            if communicator not in timed_out:
+                await communicator.disconnect()
+        return per_client * len(communicators), latencies, sum(skipped), elapsed, memory
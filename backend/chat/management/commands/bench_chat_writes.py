@@ -0,0 +1,74 @@
+import asyncio
+import time
+from datetime import date
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.buffer import MessageBuffer
+from chat.models import Message
+from trips.models import Trip
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares chat message persistence throughput: one INSERT per message through '
+        'the database_sync_to_async thread versus the write-behind MessageBuffer. '
+        'Creates its own user and trip in the configured database and deletes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--senders', type=int, default=20, help='Concurrent senders, like sockets in one room.')
+        parser.add_argument('--messages', type=int, default=100, help='Messages per sender.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--flush-ms', type=int, default=200)
+
+    def handle(self, *args, senders, messages, batch_size, flush_ms, **kwargs):
+        user = User.objects.create(email='bench-chat@example.invalid')
+        trip = Trip.objects.create(
+            title='Chat benchmark', destination='Nowhere', owner=user,
+            start_date=date.today(), end_date=date.today(),
+        )
+        try:
+            total = senders * messages
+            direct = async_to_sync(self.run_direct)(trip, user, senders, messages)
+            buffered = async_to_sync(self.run_buffered)(trip, user, senders, messages, batch_size, flush_ms)
+
+            stored = Message.objects.filter(trip=trip).count()
+            if stored != 2 * total:
+                raise CommandError(f'Expected {2 * total} stored messages, found {stored}')
+
+            self.stdout.write(f'{total} messages from {senders} senders')
+            self.stdout.write(f'direct:       {direct:.2f}s ({total / direct:.0f} msgs/sec)')
+            self.stdout.write(f'write-behind: {buffered:.2f}s ({total / buffered:.0f} msgs/sec, '
+                              f'batch_size={batch_size}, flush_ms={flush_ms})')
+            self.stdout.write(self.style.SUCCESS(f'Speedup x{direct / buffered:.1f}'))
+        finally:
+            trip.delete()
+            user.delete()
+
+    async def run_direct(self, trip, user, senders, messages):
+        create = database_sync_to_async(Message.objects.create)
+
+        async def sender(index):
+            for number in range(messages):
+                await create(trip_id=trip.pk, user=user, content=f'{index}:{number}')
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender(index) for index in range(senders)))
+        return time.perf_counter() - started
+
+    async def run_buffered(self, trip, user, senders, messages, batch_size, flush_ms):
+        buffer = MessageBuffer(batch_size, flush_ms)
+
+        async def sender(index):
+            for number in range(messages):
+                await buffer.add(Message(trip_id=trip.pk, user=user, content=f'{index}:{number}'))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender(index) for index in range(senders)))
+        # Time includes draining the tail so both runs persist everything.
+        await buffer.flush()
+        return time.perf_counter() - started
@@ -2,19 +2,23 @@ from urllib.parse import parse_qs
 from django.contrib.auth.models import AnonymousUser
 from channels.db import database_sync_to_async
 from rest_framework_simplejwt.tokens import AccessToken
-from django.contrib.auth import get_user_model
+from users.cache import user_cache
 
-User = get_user_model()
-
-@database_sync_to_async
-def get_user(token):
+async def get_user(token):
     try:
         access_token = AccessToken(token)
         user_id = access_token['user_id']
-        return User.objects.get(id=user_id)
     except Exception:
         return AnonymousUser()
 
+    # Reconnect storms hit the cache; only a miss needs the database thread.
+    user = await user_cache.apeek(user_id)
+    if user is None:
+        user = await database_sync_to_async(user_cache.get)(user_id)
+    if user is None or not user.is_active:
+        return AnonymousUser()
+    return user
+
 class JwtAuthMiddleware:
     def __init__(self, inner):
         self.inner = inner
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_initial'),
+        ('trips', '0010_itineraryitem_trip_start_time_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['trip', 'timestamp'], name='chat_messag_trip_id_33b868_idx'),
+        ),
+    ]
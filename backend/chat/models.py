@@ -10,6 +10,7 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [models.Index(fields=['trip', 'timestamp'])]
 
     def __str__(self):
         return f'{self.user.email}: {self.content[:20]}'
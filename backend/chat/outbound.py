@@ -0,0 +1,119 @@
+import asyncio
+from collections import Counter, deque
+
+from django.core.exceptions import ImproperlyConfigured
+
+POLICIES = ('coalesce', 'drop_oldest', 'disconnect')
+
+# Process-wide counters across all sockets: enqueued, sent, dropped,
+# coalesced, disconnects, plus the current total queue depth.
+stats = Counter()
+
+
+def outbound_stats():
+    return dict(stats)
+
+
+def collect_metrics():
+    """Gauges and counters for core.metrics."""
+    return [
+        ('chat_outbound_queue_depth', 'gauge', 'Frames queued for chat sockets.', stats['depth']),
+        ('chat_outbound_dropped_total', 'counter', 'Chat frames dropped or coalesced for slow sockets.', stats['dropped']),
+        ('chat_outbound_disconnects_total', 'counter', 'Chat sockets closed for falling behind.', stats['disconnects']),
+    ]
+
+
+class OutboundQueue:
+    """
+    Bounded FIFO of frames waiting to be sent to one socket.
+
+    ``send()`` returning says nothing about the client: the server buffers
+    whatever the transport can't write yet. Clients that support it pace
+    delivery instead: every frame taken from the queue gets the next ``seq``,
+    the client acknowledges what it has processed with ``ack(seq)``, and no
+    more than ``window`` frames are handed out beyond the last ack. A client
+    that stops reading stops acking, and its frames pile up here. With
+    ``window=None`` frames go out as fast as the socket takes them.
+
+    When a slow client lets ``maxsize`` frames pile up, ``policy`` decides:
+
+    * ``drop_oldest``: discard the oldest frame to make room.
+    * ``coalesce``: replace everything queued with one ``{"type": "missed",
+      "count": n}`` marker so the client knows how much it skipped.
+    * ``disconnect``: refuse the frame; the caller closes the socket and the
+      client reconnects to a fresh history page.
+    """
+
+    def __init__(self, maxsize=100, policy='coalesce', window=None):
+        if policy not in POLICIES:
+            raise ImproperlyConfigured(f'Unknown outbound queue policy {policy!r}; use one of {POLICIES}')
+        self.maxsize = maxsize
+        self.policy = policy
+        self.window = window
+        self.sent = 0
+        self.acked = 0
+        self.max_depth = 0
+        self.dropped = 0
+        self._frames = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, frame):
+        """Queue ``frame``; returns False if the socket should be disconnected."""
+        if len(self._frames) >= self.maxsize:
+            if self.policy == 'disconnect':
+                stats['disconnects'] += 1
+                return False
+            if self.policy == 'drop_oldest':
+                self._frames.popleft()
+                self._dropped(1)
+                stats['depth'] -= 1
+            else:
+                self._coalesce()
+
+        self._frames.append(frame)
+        stats['enqueued'] += 1
+        stats['depth'] += 1
+        self.max_depth = max(self.max_depth, len(self._frames))
+        self._ready.set()
+        return True
+
+    async def get(self):
+        """The next frame, once there is one and the client has room for it; its seq is ``self.sent``."""
+        while not self._frames or self.window is not None and self.sent - self.acked >= self.window:
+            self._ready.clear()
+            await self._ready.wait()
+        self.sent += 1
+        stats['depth'] -= 1
+        stats['sent'] += 1
+        return self._frames.popleft()
+
+    def ack(self, seq):
+        """The client has processed every frame up to ``seq``; returns False for a bogus seq."""
+        if self.window is None or not isinstance(seq, int) or isinstance(seq, bool):
+            return False
+        if not self.acked <= seq <= self.sent:
+            return False
+        self.acked = seq
+        self._ready.set()
+        return True
+
+    def close(self):
+        """Forget whatever is still queued, e.g. once the socket is gone."""
+        stats['depth'] -= len(self._frames)
+        self._frames.clear()
+
+    def _coalesce(self):
+        markers = [frame['count'] for frame in self._frames if frame.get('type') == 'missed']
+        skipped = len(self._frames) - len(markers)
+        self._dropped(skipped)
+        stats['coalesced'] += 1
+        stats['depth'] -= len(self._frames) - 1
+        self._frames.clear()
+        self._frames.append({'type': 'missed', 'count': sum(markers) + skipped})
+
+    def _dropped(self, count):
+        self.dropped += count
+        stats['dropped'] += count
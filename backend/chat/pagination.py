@@ -0,0 +1,5 @@
+from core.pagination import KeysetPagination
+
+
+class MessagePagination(KeysetPagination):
+    ordering = ('timestamp',)
@@ -1,3 +1,446 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.pagination import encode_cursor
+from trips.models import Trip, TripMembership
+from users.models import User
+from .buffer import MessageBuffer
+from .consumers import ChatConsumer
+from .models import Message
+from .outbound import OutboundQueue, outbound_stats
+
+IN_MEMORY_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+class ChatHistoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@example.com')
+        cls.guest = User.objects.create_user(email='guest@example.com')
+        cls.trip = Trip.objects.create(
+            owner=cls.owner, title='Lisbon', destination='Lisbon',
+            start_date='2025-05-01', end_date='2025-05-05', budget=1000,
+        )
+        start = timezone.now() - timedelta(days=1)
+        messages = Message.objects.bulk_create([
+            Message(trip=cls.trip, user=cls.owner if i % 2 else cls.guest, content=f'message {i}')
+            for i in range(120)
+        ])
+        # auto_now_add stamps the whole batch alike; spread them out.
+        for i, message in enumerate(messages):
+            message.timestamp = start + timedelta(seconds=i)
+        Message.objects.bulk_update(messages, ['timestamp'])
+
+    def communicator(self, user=None):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.trip.pk}/')
+        communicator.scope['url_route'] = {'kwargs': {'trip_id': str(self.trip.pk)}}
+        communicator.scope['user'] = user or self.owner
+        return communicator
+
+    def test_connect_sends_newest_page_in_one_frame(self):
+        async def run():
+            communicator = self.communicator()
+            await communicator.connect()
+            frame = await communicator.receive_json_from()
+            self.assertTrue(await communicator.receive_nothing())
+            await communicator.disconnect()
+            return frame
+
+        with CaptureQueriesContext(connection) as queries:
+            frame = async_to_sync(run)()
+
+        self.assertEqual(frame['type'], 'history')
+        self.assertEqual(len(frame['messages']), ChatConsumer.history_page_size)
+        self.assertEqual(frame['messages'][0]['message'], 'message 70')
+        self.assertEqual(frame['messages'][-1]['message'], 'message 119')
+        self.assertIsNotNone(frame['cursor'])
+        # Membership check plus the history page.
+        self.assertEqual(len(queries), 2)
+
+    def test_load_more_pages_back_to_the_first_message(self):
+        async def run():
+            communicator = self.communicator()
+            await communicator.connect()
+            frames = [await communicator.receive_json_from()]
+            while frames[-1]['cursor']:
+                await communicator.send_json_to({'command': 'load_more', 'cursor': frames[-1]['cursor']})
+                frames.append(await communicator.receive_json_from())
+            errors = []
+            bad_timestamp = encode_cursor(['yesterday', 1])
+            for cursor in ('not-a-cursor', bad_timestamp, 42, ['a']):
+                await communicator.send_json_to({'command': 'load_more', 'cursor': cursor})
+                errors.append(await communicator.receive_json_from())
+            # The consumer is still serving after the bad cursors.
+            await communicator.send_json_to({'command': 'load_more', 'cursor': frames[0]['cursor']})
+            errors.append(await communicator.receive_json_from())
+            await communicator.disconnect()
+            return frames, errors
+
+        frames, errors = async_to_sync(run)()
+
+        self.assertEqual([len(frame['messages']) for frame in frames], [50, 50, 20])
+        contents = [m['message'] for frame in reversed(frames) for m in frame['messages']]
+        self.assertEqual(contents, [f'message {i}' for i in range(120)])
+        self.assertEqual([error['type'] for error in errors], ['error'] * 4 + ['history'])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+class ChatAuthorizationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@example.com')
+        cls.stranger = User.objects.create_user(email='stranger@example.com')
+        cls.trip = Trip.objects.create(
+            owner=cls.owner, title='Oslo', destination='Oslo',
+            start_date='2025-05-01', end_date='2025-05-05', budget=1000,
+        )
+
+    def connect(self, user):
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.trip.pk}/')
+            communicator.scope['url_route'] = {'kwargs': {'trip_id': str(self.trip.pk)}}
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            if connected:
+                await communicator.disconnect()
+            return connected
+        return async_to_sync(run)()
+
+    def test_non_members_are_rejected(self):
+        self.assertFalse(self.connect(self.stranger))
+        self.assertFalse(self.connect(AnonymousUser()))
+        self.assertTrue(self.connect(self.owner))
+
+    def test_each_message_is_a_single_insert(self):
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.trip.pk}/')
+            communicator.scope['url_route'] = {'kwargs': {'trip_id': str(self.trip.pk)}}
+            communicator.scope['user'] = self.owner
+            await communicator.connect()
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'message': 'hello'})
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return frame
+
+        with CaptureQueriesContext(connection) as queries:
+            frame = async_to_sync(run)()
+
+        self.assertEqual(frame, {'message': 'hello', 'user': 'owner@example.com'})
+        # Membership check and history at connect, then only the INSERT.
+        self.assertEqual(len(queries), 3)
+        self.assertTrue(queries[-1]['sql'].startswith('INSERT'))
+        self.assertEqual(Message.objects.get().trip, self.trip)
+
+
+class MessageBufferTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@example.com')
+        cls.trip = Trip.objects.create(
+            owner=cls.owner, title='Rome', destination='Rome',
+            start_date='2025-05-01', end_date='2025-05-05', budget=1000,
+        )
+
+    def message(self, content):
+        return Message(trip=self.trip, user=self.owner, content=content)
+
+    def test_flushes_when_batch_is_full(self):
+        buffer = MessageBuffer(batch_size=3, flush_ms=60000)
+
+        async def run():
+            for index in range(4):
+                await buffer.add(self.message(str(index)))
+
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(run)()
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['0', '1', '2'])
+        self.assertEqual(len(buffer), 1)
+        buffer.flush_sync()
+        self.assertEqual(Message.objects.count(), 4)
+
+    def test_flushes_after_delay(self):
+        buffer = MessageBuffer(batch_size=100, flush_ms=10)
+
+        async def run():
+            await buffer.add(self.message('late'))
+            await asyncio.sleep(0.1)
+
+        async_to_sync(run)()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(Message.objects.get().content, 'late')
+
+    def test_timer_is_rescheduled_after_its_loop_closes(self):
+        buffer = MessageBuffer(batch_size=100, flush_ms=60000)
+        # The timer from this loop never fires: the loop closes first.
+        async_to_sync(buffer.add)(self.message('stranded'))
+        buffer.flush_ms = 10
+
+        async def run():
+            await buffer.add(self.message('next'))
+            await asyncio.sleep(0.1)
+
+        async_to_sync(run)()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(Message.objects.count(), 2)
+
+    @override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS, CHAT_WRITE_BEHIND=True)
+    def test_consumer_broadcasts_then_flushes_on_disconnect(self):
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.trip.pk}/')
+            communicator.scope['url_route'] = {'kwargs': {'trip_id': str(self.trip.pk)}}
+            communicator.scope['user'] = self.owner
+            await communicator.connect()
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'message': 'buffered'})
+            frame = await communicator.receive_json_from()
+            pending = await database_sync_to_async(Message.objects.count)()
+            await communicator.disconnect()
+            return frame, pending
+
+        frame, pending = async_to_sync(run)()
+
+        self.assertEqual(frame['message'], 'buffered')
+        self.assertEqual(pending, 0)
+        self.assertEqual(Message.objects.get().content, 'buffered')
+
+class MessageBufferFailureTest(TransactionTestCase):
+    # Outside a test transaction, like the buffer's own writes, so a failed
+    # batch doesn't poison the rows written after it.
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com')
+        self.trip = Trip.objects.create(
+            owner=self.owner, title='Rome', destination='Rome',
+            start_date='2025-05-01', end_date='2025-05-05', budget=1000,
+        )
+
+    def message(self, content):
+        return Message(trip=self.trip, user=self.owner, content=content)
+
+    def test_failed_batch_is_retried_without_new_messages(self):
+        buffer = MessageBuffer(batch_size=100, flush_ms=10, max_retries=3)
+        write = buffer._write
+        attempts = []
+
+        def flaky_write(batch):
+            attempts.append(len(batch))
+            if len(attempts) == 1:
+                raise RuntimeError('database unavailable')
+            write(batch)
+
+        buffer._write = flaky_write
+
+        async def run():
+            await buffer.add(self.message('quiet room'))
+            # First flush at 10ms fails; the retry is due 20ms after that.
+            await asyncio.sleep(0.2)
+
+        with self.assertLogs('chat.buffer', 'ERROR'):
+            async_to_sync(run)()
+
+        self.assertEqual(attempts, [1, 1])
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(Message.objects.get().content, 'quiet room')
+
+    def test_failed_batch_is_retried_then_written_row_by_row(self):
+        buffer = MessageBuffer(batch_size=100, flush_ms=60000, max_retries=1)
+        # NULL content fails the NOT NULL constraint, and with it the batch.
+        messages = [self.message('first'), self.message(None), self.message('last')]
+
+        async def run():
+            for message in messages:
+                await buffer.add(message)
+            await buffer.flush()
+            pending = len(buffer)
+            await buffer.flush()
+            return pending
+
+        with self.assertLogs('chat.buffer', 'ERROR') as logs:
+            pending = async_to_sync(run)()
+
+        self.assertEqual(pending, 3)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(sorted(Message.objects.values_list('content', flat=True)), ['first', 'last'])
+        self.assertIn('Dropping chat message', logs.output[-1])
+
+
+
+class OutboundQueueTest(SimpleTestCase):
+    def fill(self, queue, count):
+        return [queue.put({'message': str(index), 'user': 'a@example.com'}) for index in range(count)]
+
+    def drain(self, queue):
+        async def run():
+            return [await queue.get() for _ in range(len(queue))]
+        return async_to_sync(run)()
+
+    def test_drop_oldest_keeps_the_newest_frames(self):
+        queue = OutboundQueue(maxsize=3, policy='drop_oldest')
+        self.assertTrue(all(self.fill(queue, 5)))
+        self.assertEqual(queue.dropped, 2)
+        self.assertEqual([frame['message'] for frame in self.drain(queue)], ['2', '3', '4'])
+
+    def test_coalesce_replaces_backlog_with_a_missed_marker(self):
+        queue = OutboundQueue(maxsize=3, policy='coalesce')
+        self.fill(queue, 7)
+        frames = self.drain(queue)
+        # 0-2 collapse when 3 arrives; the marker and 3-4 collapse when 5 arrives.
+        self.assertEqual(frames, [
+            {'type': 'missed', 'count': 5},
+            {'message': '5', 'user': 'a@example.com'},
+            {'message': '6', 'user': 'a@example.com'},
+        ])
+        self.assertEqual(queue.dropped, 5)
+        self.assertLessEqual(queue.max_depth, 3)
+
+    def test_disconnect_refuses_frames_once_full(self):
+        before = outbound_stats().get('disconnects', 0)
+        queue = OutboundQueue(maxsize=2, policy='disconnect')
+        self.assertEqual(self.fill(queue, 3), [True, True, False])
+        self.assertEqual(outbound_stats()['disconnects'], before + 1)
+
+    def test_depth_is_released_on_close(self):
+        before = outbound_stats().get('depth', 0)
+        queue = OutboundQueue(maxsize=10)
+        self.fill(queue, 4)
+        self.assertEqual(outbound_stats()['depth'], before + 4)
+        queue.close()
+        self.assertEqual(outbound_stats()['depth'], before)
+
+    def test_frames_wait_for_acks_beyond_the_window(self):
+        queue = OutboundQueue(maxsize=10, window=2)
+        self.fill(queue, 4)
+
+        async def run():
+            first = [await queue.get(), await queue.get()]
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(queue.get(), 0.05)
+            self.assertFalse(queue.ack(3))
+            self.assertTrue(queue.ack(1))
+            return first + [await asyncio.wait_for(queue.get(), 1)]
+
+        frames = async_to_sync(run)()
+        self.assertEqual([frame['message'] for frame in frames], ['0', '1', '2'])
+        self.assertEqual((queue.sent, queue.acked, len(queue)), (3, 1, 1))
+
+
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_LAYERS,
+    CHAT_OUTBOUND_QUEUE_SIZE=3, CHAT_OUTBOUND_POLICY='disconnect', CHAT_OUTBOUND_WINDOW=2,
+)
+class ChatBackpressureTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@example.com')
+        cls.reader = User.objects.create_user(email='reader@example.com')
+        cls.trip = Trip.objects.create(
+            owner=cls.owner, title='Oslo', destination='Oslo',
+            start_date='2025-05-01', end_date='2025-05-05', budget=1000,
+        )
+        TripMembership.objects.create(trip=cls.trip, user=cls.reader, role='viewer')
+
+    def communicator(self, user, query='?acks=1'):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.trip.pk}/{query}')
+        communicator.scope['url_route'] = {'kwargs': {'trip_id': str(self.trip.pk)}}
+        communicator.scope['user'] = user
+        return communicator
+
+    def test_client_that_never_reads_is_disconnected(self):
+        async def run():
+            sender, stalled = self.communicator(self.owner), self.communicator(self.reader)
+            for communicator in (sender, stalled):
+                await communicator.connect()
+                await communicator.receive_json_from()
+            # The sender reads and acks every frame; the other socket never reads.
+            received = []
+            for index in range(8):
+                await sender.send_json_to({'message': str(index)})
+                frame = await sender.receive_json_from()
+                await sender.send_json_to({'command': 'ack', 'seq': frame['seq']})
+                received.append(frame)
+            frames = []
+            while True:
+                output = await stalled.receive_output()
+                if output['type'] == 'websocket.close':
+                    break
+                frames.append(json.loads(output['text']))
+            await sender.disconnect()
+            return received, frames, output
+
+        received, frames, close = async_to_sync(run)()
+
+        self.assertEqual([frame['seq'] for frame in received], list(range(1, 9)))
+        # Two frames in flight without an ack, three queued, then the socket is dropped.
+        self.assertEqual([frame['message'] for frame in frames], ['0', '1'])
+        self.assertEqual(close['code'], 4008)
+
+    def test_clients_without_acks_are_not_paced(self):
+        async def run():
+            sender, legacy = self.communicator(self.owner), self.communicator(self.reader, query='')
+            for communicator in (sender, legacy):
+                await communicator.connect()
+                await communicator.receive_json_from()
+            for index in range(8):
+                await sender.send_json_to({'message': str(index)})
+                frame = await sender.receive_json_from()
+                await sender.send_json_to({'command': 'ack', 'seq': frame['seq']})
+            frames = [await legacy.receive_json_from() for _ in range(8)]
+            await legacy.send_json_to({'command': 'ack', 'seq': 1})
+            error = await legacy.receive_json_from()
+            await sender.disconnect()
+            await legacy.disconnect()
+            return frames, error
+
+        frames, error = async_to_sync(run)()
+
+        self.assertEqual(frames, [{'message': str(index), 'user': 'owner@example.com'} for index in range(8)])
+        self.assertEqual(error['type'], 'error')
+
+
+class AsyncMessageHistoryViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@example.com')
+        cls.stranger = User.objects.create_user(email='stranger@example.com')
+        cls.trip = Trip.objects.create(
+            owner=cls.owner, title='Lisbon', destination='Lisbon',
+            start_date='2025-05-01', end_date='2025-05-05', budget=1000,
+        )
+        Message.objects.bulk_create([
+            Message(trip=cls.trip, user=cls.owner, content=f'message {i}') for i in range(5)
+        ])
+
+    def auth(self, user):
+        return {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+    async def test_matches_sync_view(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        for params in ({'trip_id': self.trip.pk}, {'trip_id': self.trip.pk, 'page_size': 2}):
+            expected = (await database_sync_to_async(client.get)('/api/chat/history/', params)).json()
+            response = await self.async_client.get('/api/chat/history/async/', params, headers=self.auth(self.owner))
+            self.assertEqual(response.status_code, 200)
+            # Same payload; only the path in any ``next`` link differs.
+            self.assertEqual(json.loads(response.content.decode().replace('/history/async/', '/history/')), expected)
+
+    async def test_non_member_sees_nothing(self):
+        response = await self.async_client.get(
+            '/api/chat/history/async/', {'trip_id': self.trip.pk}, headers=self.auth(self.stranger))
+        self.assertEqual(response.json(), [])
@@ -2,5 +2,6 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    # Add message history endpoint if needed later
+    path('history/', views.MessageHistoryView.as_view(), name='message-history'),
+    path('history/async/', views.AsyncMessageHistoryView.as_view(), name='message-history-async'),
 ]
@@ -1,11 +1,30 @@
 from rest_framework import generics, permissions
+from core.views import AsyncReadView, TimedSerializerMixin
 from .models import Message
+from .pagination import MessagePagination
 from .serializers import MessageSerializer
 
-class MessageHistoryView(generics.ListAPIView):
+class MessageHistoryView(TimedSerializerMixin, generics.ListAPIView):
     serializer_class = MessageSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = MessagePagination
 
     def get_queryset(self):
-        trip_id = self.request.query_params.get('trip_id')
-        return Message.objects.filter(trip_id=trip_id)
+        return history_queryset(self.request)
+
+
+def history_queryset(request):
+    trip_id = request.query_params.get('trip_id')
+    if not trip_id:
+        return Message.objects.none()
+    return Message.objects.filter(
+        trip_id=trip_id, trip__memberships__user=request.user
+    ).select_related('user')
+
+
+class AsyncMessageHistoryView(AsyncReadView):
+    """Async read path for the message history, fetched through the async ORM."""
+    pagination_class = MessagePagination
+
+    async def get(self, request):
+        return await self.list(request, history_queryset(request), MessageSerializer)
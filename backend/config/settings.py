@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+import sys
 import environ
 from pathlib import Path
 from datetime import timedelta
@@ -65,11 +66,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'core.middleware.RequestLoggingMiddleware',
+    'core.middleware.QueryInspectorMiddleware',
     'core.middleware.GlobalErrorHandlingMiddleware',
-    'core.middleware.SimpleRateLimitMiddleware',
+    'core.middleware.RateLimitMiddleware',
     'core.middleware.AuthenticationCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -122,15 +124,22 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Opt-in: only applied when the client sends ?cursor= or ?page_size=.
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'core.throttling.AnonRateThrottle',
+        'core.throttling.UserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
@@ -144,6 +153,68 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Deploys set REDIS_URL for channels; the default cache and the rate limits
+# share it so every worker sees the same counters. Without it (local
+# development) and under `manage.py test` they stay in-process.
+REDIS_URL = env('REDIS_URL', default='')
+TESTING = sys.argv[1:2] == ['test']
+SHARED_REDIS_URL = '' if TESTING else env('REDIS_CACHE_URL', default=REDIS_URL)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SHARED_REDIS_URL,
+    } if SHARED_REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Rate limiting for RateLimitMiddleware and the DRF throttles. BACKEND is
+# 'redis' (one Lua round trip to URL) or 'cache' (atomic incr on the ALIAS
+# cache, two round trips). Limits apply per user, or per IP for anonymous
+# requests.
+RATE_LIMIT = {
+    'BACKEND': env('RATE_LIMIT_BACKEND', default='redis' if SHARED_REDIS_URL else 'cache'),
+    'ALIAS': 'default',
+    'URL': env('RATE_LIMIT_REDIS_URL', default=SHARED_REDIS_URL or 'redis://localhost:6379/2'),
+}
+RATE_LIMIT_DEFAULT = '500/10m'
+RATE_LIMIT_ROUTES = {
+    'token_obtain_pair': '20/m',
+    'register': '10/m',
+    'google_login': '20/m',
+}
+
+# Versioned per-trip response cache (trips.cache): 'locmem', 'file' or 'redis'.
+RESPONSE_CACHE_BACKEND = env('RESPONSE_CACHE_BACKEND', default='locmem')
+CACHES['responses'] = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'trip-responses',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env('RESPONSE_CACHE_LOCATION', default=str(BASE_DIR / 'response_cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env('RESPONSE_CACHE_LOCATION', default='redis://localhost:6379/3'),
+    },
+}[RESPONSE_CACHE_BACKEND]
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TTL = 300
+
+# Per-process cache of authenticated users shared by REST and WebSocket auth.
+# Saves and deletes replace a per-user version in USER_CACHE_ALIAS, which every
+# process checks on a hit. That only reaches other workers when the alias is
+# shared: 'default' is Redis once REDIS_URL is set. On the LocMem fallback
+# other workers see a deactivated user only after USER_CACHE_TTL.
+USER_CACHE_TTL = 60
+USER_CACHE_SIZE = 10000
+USER_CACHE_ALIAS = 'default'
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Smart Trip Planner API',
     'DESCRIPTION': 'API for Managing Trips, Itineraries, Polls, and Chat',
@@ -155,11 +226,48 @@ CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [env('REDIS_URL', default='redis://localhost:6379/1')],
+            "hosts": [REDIS_URL or 'redis://localhost:6379/1'],
         },
     },
 }
 
+CHAT_HISTORY_PAGE_SIZE = 50
+
+# Write-behind persistence for chat: broadcast first, then insert in batches
+# of up to CHAT_WRITE_BEHIND_BATCH_SIZE or every CHAT_WRITE_BEHIND_FLUSH_MS.
+CHAT_WRITE_BEHIND = env.bool('CHAT_WRITE_BEHIND', default=False)
+CHAT_WRITE_BEHIND_BATCH_SIZE = 100
+CHAT_WRITE_BEHIND_FLUSH_MS = 200
+# Failed batches are retried this many times, then written row by row.
+CHAT_WRITE_BEHIND_MAX_RETRIES = 3
+
+# Per-socket outbound queue bound and what to do when a slow client fills it:
+# 'coalesce', 'drop_oldest' or 'disconnect'.
+CHAT_OUTBOUND_QUEUE_SIZE = 100
+CHAT_OUTBOUND_POLICY = 'coalesce'
+# Broadcast frames a client that connected with ?acks=1 may have
+# unacknowledged ({"command": "ack", "seq": n}) before the rest wait in the
+# outbound queue. Other clients are not paced.
+CHAT_OUTBOUND_WINDOW = 32
+
+# Trip change feed: changes within this window are sent as one frame.
+TRIP_EVENTS_COALESCE_MS = 100
+
+# Delta sync: tokens older than the change-log retention get 410 and must
+# resync in full; changes this close to a token's issue time are resent.
+SYNC_RETENTION_DAYS = 30
+SYNC_GRACE_SECONDS = 5
+
+# Bearer token required to scrape /metrics. With none set, /metrics is only
+# served when DEBUG is on.
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# N+1 / slow query detection for development: statement shapes seen this many
+# times in one request, or statements slower than the budget, are reported.
+QUERY_INSPECTOR_ENABLED = env.bool('QUERY_INSPECTOR_ENABLED', default=False)
+QUERY_INSPECTOR_REPEAT_THRESHOLD = 5
+QUERY_INSPECTOR_SLOW_MS = 100
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -4,6 +4,8 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, Spec
 
 from django.views.generic import RedirectView
 
+from core.views import metrics
+
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -13,6 +15,7 @@ urlpatterns = [
     path('api/users/', include('users.urls')),
     path('api/trips/', include('trips.urls')),
     path('api/chat/', include('chat.urls')),
+    path('metrics', metrics, name='metrics'),
     
     # documentation
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -0,0 +1,92 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """
+    Counters for the work done while handling one request. ``statements`` is
+    ``None`` unless SQL capture was asked for, then a list of ``(sql, seconds)``.
+    Queries also count toward enclosing stats, e.g. a test wrapping a request.
+    """
+
+    def __init__(self, parent=None, capture_sql=False):
+        self.parent = parent
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_seconds = 0.0
+        self.statements = [] if capture_sql else None
+
+    def record_query(self, sql, seconds):
+        stats = self
+        while stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += seconds
+            if stats.statements is not None:
+                stats.statements.append((sql, seconds))
+            stats = stats.parent
+
+
+def current_stats():
+    """The stats for the request being handled in this context, if any."""
+    return _current.get()
+
+
+@contextmanager
+def instrument_request(capture_sql=False):
+    """
+    Collect RequestStats for everything run inside the block. The stats live
+    in a context variable, so queries issued from sync_to_async threads are
+    attributed to the request that awaited them.
+    """
+    stats = RequestStats(parent=_current.get(), capture_sql=capture_sql)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def timed_serializer(serializer):
+    """
+    Count the time ``serializer.data`` spends in ``to_representation`` toward
+    the request's ``serialize_seconds``. Wrapping the outermost serializer
+    covers nested and list children, and any lazy queries they run.
+    """
+    to_representation = serializer.to_representation
+
+    def timed(instance):
+        started = time.perf_counter()
+        try:
+            return to_representation(instance)
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.serialize_seconds += time.perf_counter() - started
+
+    serializer.to_representation = timed
+    return serializer
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created, dispatch_uid='core_instrument_connection')
+def install_query_hook(sender, connection, **kwargs):
+    # Every thread gets its own connection, so hook each one as it opens.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
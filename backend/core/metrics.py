@@ -0,0 +1,110 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels):
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}' if labels else ''
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    In-process counters and histograms, rendered in the Prometheus text format.
+    Each worker process keeps its own; Prometheus aggregates across scrapes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            self._counters[(name, tuple(labels))] += amount
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def register_collector(self, collector):
+        """
+        Add a callable returning ``(name, kind, help, value)`` tuples, read at
+        scrape time. Used for gauges owned by other apps.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            series = defaultdict(list)
+            for (name, labels), value in sorted(self._counters.items()):
+                series[name].append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    bucket_labels = labels + (('le', bound),)
+                    series[name].append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+                series[name].append(f'{name}_sum{_format_labels(labels)} {_format_number(histogram.sum)}')
+                series[name].append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+            described = dict(self._help)
+
+        for collector in self._collectors:
+            for name, kind, help_text, value in collector():
+                described[name] = (kind, help_text)
+                series[name].append(f'{name} {_format_number(value)}')
+
+        for name in sorted(series):
+            kind, help_text = described.get(name, ('untyped', ''))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(series[name])
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = Registry()
+registry.describe('http_requests_total', 'counter', 'Requests handled, by route, method and status.')
+registry.describe('http_request_duration_seconds', 'histogram', 'Request latency by route and method.')
+registry.describe('http_request_db_queries', 'histogram', 'SQL statements per request by route and method.')
+registry.describe('http_request_db_seconds_total', 'counter', 'Time spent in SQL by route and method.')
+registry.describe('http_request_serialize_seconds_total', 'counter', 'Time spent building serializer data by route and method.')
+registry.describe('http_request_render_seconds_total', 'counter', 'Time spent rendering response bodies by route and method.')
+registry.describe('http_response_bytes_total', 'counter', 'Response body bytes by route and method.')
@@ -1,70 +1,254 @@
 import logging
 import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.http import JsonResponse
-from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.tokens import AccessToken
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .instrumentation import instrument_request
+from .metrics import QUERY_COUNT_BUCKETS, registry
+from .queryinspector import QueryReport
+from .ratelimit import get_limiter, parse_rate
 
 logger = logging.getLogger(__name__)
 
-class RequestLoggingMiddleware:
+def route_name(request):
+    """The URL name (e.g. ``trip-detail``) rather than the raw path, so metrics don't explode per id."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unmatched>'
+    return match.view_name or match.route
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs natively in both modes. Under daphne the
+    chain then stays async end to end, instead of Django hopping to a thread
+    for every sync-only middleware. Subclasses implement ``handle`` for WSGI
+    and ``ahandle`` for ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        start_time = time.time()
-        response = self.get_response(request)
-        duration = time.time() - start_time
-        
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        return await self.get_response(request)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise made async-capable: API requests pass straight through under
+    ASGI, and only static file hits are served from a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.ahandle(request)
+        return super().__call__(request)
+
+    async def ahandle(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+class RequestLoggingMiddleware(HybridMiddleware):
+    """
+    Logs one structured line per request and feeds the /metrics histograms:
+    latency, SQL count and time, response rendering time and body size, all
+    labelled by route name and method.
+    """
+    def handle(self, request):
+        start_time = time.perf_counter()
+        with instrument_request() as stats:
+            response = self.get_response(request)
+        self.record(request, response, stats, time.perf_counter() - start_time)
+        return response
+
+    async def ahandle(self, request):
+        start_time = time.perf_counter()
+        with instrument_request() as stats:
+            response = await self.get_response(request)
+        self.record(request, response, stats, time.perf_counter() - start_time)
+        return response
+
+    def record(self, request, response, stats, duration):
+        route = route_name(request)
+        size = 0 if response.streaming else len(response.content)
+        labels = (('route', route), ('method', request.method))
+        registry.inc('http_requests_total', labels + (('status', response.status_code),))
+        registry.observe('http_request_duration_seconds', labels, duration)
+        registry.observe('http_request_db_queries', labels, stats.db_queries, QUERY_COUNT_BUCKETS)
+        registry.inc('http_request_db_seconds_total', labels, stats.db_seconds)
+        registry.inc('http_request_serialize_seconds_total', labels, stats.serialize_seconds)
+        registry.inc('http_request_render_seconds_total', labels, stats.render_seconds)
+        registry.inc('http_response_bytes_total', labels, size)
+
         logger.info(
-            f"Method: {request.method} Path: {request.path} "
-            f"Status: {response.status_code} Duration: {duration:.2f}s"
+            'request method=%s route=%s status=%s duration_ms=%.1f db_queries=%d db_ms=%.1f serialize_ms=%.1f render_ms=%.1f '
+            'bytes=%d',
+            request.method, route, response.status_code, duration * 1000, stats.db_queries,
+            stats.db_seconds * 1000, stats.serialize_seconds * 1000, stats.render_seconds * 1000, size,
+            extra={'request_metrics': {
+                'method': request.method,
+                'route': route,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 3),
+                'db_queries': stats.db_queries,
+                'db_ms': round(stats.db_seconds * 1000, 3),
+                'serialize_ms': round(stats.serialize_seconds * 1000, 3),
+                'render_ms': round(stats.render_seconds * 1000, 3),
+                'bytes': size,
+            }},
         )
-        return response
 
-class GlobalErrorHandlingMiddleware:
+class QueryInspectorMiddleware(HybridMiddleware):
+    """
+    Development aid, enabled with QUERY_INSPECTOR_ENABLED: records every SQL
+    statement per request and warns about repeated shapes (N+1) and slow
+    queries. With DEBUG on, the findings are also sent as X-Query-* headers.
+    """
     def __init__(self, get_response):
-        self.get_response = get_response
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
 
-    def __call__(self, request):
+    def handle(self, request):
+        with instrument_request(capture_sql=True) as stats:
+            response = self.get_response(request)
+        return self.report(request, response, stats)
+
+    async def ahandle(self, request):
+        with instrument_request(capture_sql=True) as stats:
+            response = await self.get_response(request)
+        return self.report(request, response, stats)
+
+    def report(self, request, response, stats):
+        report = QueryReport(stats.statements)
+        if report:
+            logger.warning('Query problems in %s %s: %s', request.method, route_name(request), report.format())
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(report.count)
+            response['X-Query-Time-Ms'] = f'{report.seconds * 1000:.1f}'
+            response['X-Query-Repeated'] = str(len(report.repeated))
+            response['X-Query-Slow'] = str(len(report.slow))
+        return response
+
+class GlobalErrorHandlingMiddleware(HybridMiddleware):
+    def handle(self, request):
         try:
             response = self.get_response(request)
             return response
         except Exception as e:
-            import traceback
-            tb = traceback.format_exc()
-            print(f"DEBUG ERROR: {tb}")
-            logger.exception("Global error caught")
-            return JsonResponse({
-                'error': 'An internal server error occurred.',
-                'detail': str(e),
-                'traceback': tb if True else None # Always show in this debug phase
-            }, status=500)
-
-class SimpleRateLimitMiddleware:
-    """Example middleware for rate limiting at the application level."""
-    def __init__(self, get_response):
-        self.get_response = get_response
+            return self.error_response(e)
 
-    def __call__(self, request):
-        ip = request.META.get('REMOTE_ADDR')
-        key = f"ratelimit_{ip}"
-        
+    async def ahandle(self, request):
         try:
-            count = cache.get(key, 0)
-            if count >= 500: # Limit to 500 requests per 10 minutes
-                 return JsonResponse({'error': 'Too many requests. Please try again later.'}, status=429)
-            cache.set(key, count + 1, 600) # 10 minutes
+            return await self.get_response(request)
+        except Exception as e:
+            return self.error_response(e)
+
+    def error_response(self, e):
+        import traceback
+        tb = traceback.format_exc()
+        print(f"DEBUG ERROR: {tb}")
+        logger.exception("Global error caught")
+        return JsonResponse({
+            'error': 'An internal server error occurred.',
+            'detail': str(e),
+            'traceback': tb if True else None # Always show in this debug phase
+        }, status=500)
+
+def client_key(request):
+    """The authenticated user from a valid bearer token, else the client IP."""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        try:
+            return f"user:{AccessToken(header[len('Bearer '):])['user_id']}"
         except Exception:
-            # If cache is down, don't block requests
             pass
-            
-        return self.get_response(request)
+    return f"ip:{request.META.get('REMOTE_ADDR')}"
 
-class AuthenticationCheckMiddleware:
-    """Explicit middleware for logging authentication status."""
+
+class RateLimitMiddleware(HybridMiddleware):
+    """
+    Sliding-window rate limit per user (or IP when anonymous), applied once the
+    route is known: RATE_LIMIT_ROUTES sets tighter limits for named routes,
+    everything else shares RATE_LIMIT_DEFAULT. Counters live in the RATE_LIMIT
+    backend, so every worker sees the same counts.
+    """
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.default = parse_rate(settings.RATE_LIMIT_DEFAULT)
+        self.routes = {name: parse_rate(rate) for name, rate in settings.RATE_LIMIT_ROUTES.items()}
+        # Django calls process_view in the handler's mode, which matches ours.
+        if self.is_async:
+            self.process_view = self.aprocess_view
 
-    def __call__(self, request):
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        key, limit, window = self.policy(request)
+        try:
+            allowed, _, retry_after = get_limiter().hit(key, limit, window)
+        except Exception:
+            # If the backend is down, don't block requests
+            logger.exception('Rate limit backend unavailable; allowing request')
+            return None
+        return None if allowed else self.limited(retry_after)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        key, limit, window = self.policy(request)
+        try:
+            allowed, _, retry_after = await get_limiter().ahit(key, limit, window)
+        except Exception:
+            logger.exception('Rate limit backend unavailable; allowing request')
+            return None
+        return None if allowed else self.limited(retry_after)
+
+    def policy(self, request):
+        """The counter key and ``(limit, window)`` that apply to this request."""
+        route = route_name(request)
+        if route in self.routes:
+            (limit, window), scope = self.routes[route], route
+        else:
+            (limit, window), scope = self.default, '*'
+        return f'{client_key(request)}:{scope}', limit, window
+
+    def limited(self, retry_after):
+        response = JsonResponse({'error': 'Too many requests. Please try again later.'}, status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
+
+class AuthenticationCheckMiddleware(HybridMiddleware):
+    """Explicit middleware for logging authentication status."""
+    def handle(self, request):
         # Note: request.user is only populated after django.contrib.auth.middleware.AuthenticationMiddleware
         # and doesn't include DRF JWT auth user at the middleware level usually.
         # But we log whatever is available.
@@ -72,3 +256,14 @@ class AuthenticationCheckMiddleware:
         if hasattr(request, 'user') and request.user.is_authenticated:
             logger.info(f"Authenticated request by: {request.user.email}")
         return response
+
+    async def ahandle(self, request):
+        response = await self.get_response(request)
+        user = getattr(request, 'user', None)
+        if isinstance(user, SimpleLazyObject):
+            # Still the session user: resolving it lazily would hit the
+            # database from the event loop.
+            user = await request.auser()
+        if user is not None and user.is_authenticated:
+            logger.info(f"Authenticated request by: {user.email}")
+        return response
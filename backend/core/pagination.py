@@ -0,0 +1,156 @@
+import base64
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _cursor_default(value):
+    # Keep full microsecond precision; DjangoJSONEncoder truncates to
+    # milliseconds, which would make datetime cursors skip or repeat rows.
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def encode_cursor(values):
+    """Encode a list of ordering values as an opaque, URL-safe cursor."""
+    payload = json.dumps(values, default=_cursor_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (TypeError, UnicodeError, ValueError, base64.binascii.Error):
+        raise ValueError('Malformed cursor')
+    if not isinstance(values, list):
+        raise ValueError('Malformed cursor')
+    return values
+
+
+def keyset_filter(ordering, values):
+    """
+    Build the "comes after" condition for a composite ordering.
+
+    For ('-created_at', '-id') and values (t, 7) this yields
+    ``created_at < t OR (created_at = t AND id < 7)``, which lets the database
+    seek straight to the next page instead of counting past an offset.
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[index]})
+        for previous, value in zip(ordering[:index], values):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    return condition
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Opt-in keyset pagination over a composite ordering.
+
+    Unlike DRF's CursorPagination, which seeks on the first ordering field only
+    and falls back to offsets for ties, the cursor here stores every ordering
+    value plus the primary key, so deep pages cost the same as the first one.
+
+    Requests without ``cursor`` or ``page_size`` are left unpaginated so the
+    existing clients that expect a bare list keep working.
+    """
+    ordering = ('-pk',)
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(self.ordering)
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            # The primary key breaks ties so the ordering is total.
+            direction = '-' if ordering[-1].startswith('-') else ''
+            ordering += (f'{direction}pk',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, fetching through the async ORM."""
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset])
+
+    def page_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        queryset = queryset.order_by(*self.ordering)
+        encoded = params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(keyset_filter(self.ordering, self.decode_position(encoded, queryset.model)))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def decode_position(self, encoded, model):
+        try:
+            values = decode_cursor(encoded)
+            if len(values) != len(self.ordering):
+                raise ValueError('Cursor does not match ordering')
+            return [
+                self._get_field(model, field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [getattr(last, self._get_field(type(last), field).attname) for field in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(values))
+
+    def get_previous_link(self):
+        return None
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'].pop('previous', None)
+        return response_schema
+
+    def get_html_context(self):
+        return {'previous_url': None, 'next_url': self.get_next_link()}
+
+    @staticmethod
+    def _get_field(model, field):
+        name = field.lstrip('-')
+        return model._meta.pk if name == 'pk' else model._meta.get_field(name)
@@ -0,0 +1,66 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .instrumentation import instrument_request
+
+_IN_LIST = re.compile(r'\bIN\s*\((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE = re.compile(r'\s+')
+_IGNORED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape: literals and IN-lists collapsed."""
+    shape = _STRING.sub('?', sql)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    shape = _NUMBER.sub('?', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+class QueryReport:
+    """
+    Repeated statement shapes and slow statements from one captured run.
+    ``repeated`` maps shape to count; ``slow`` lists ``(sql, seconds)``.
+    """
+
+    def __init__(self, statements, repeat_threshold=None, slow_ms=None):
+        repeat_threshold = repeat_threshold or settings.QUERY_INSPECTOR_REPEAT_THRESHOLD
+        slow_ms = slow_ms if slow_ms is not None else settings.QUERY_INSPECTOR_SLOW_MS
+        statements = [(sql, seconds) for sql, seconds in statements if not sql.lstrip().upper().startswith(_IGNORED)]
+
+        shapes = Counter(normalize_sql(sql) for sql, _ in statements)
+        self.count = len(statements)
+        self.seconds = sum(seconds for _, seconds in statements)
+        self.repeated = {shape: count for shape, count in shapes.most_common() if count >= repeat_threshold}
+        self.slow = [(sql, seconds) for sql, seconds in statements if seconds * 1000 > slow_ms]
+
+    def __bool__(self):
+        return bool(self.repeated or self.slow)
+
+    def format(self):
+        lines = [f'{self.count} queries in {self.seconds * 1000:.1f}ms']
+        for shape, count in self.repeated.items():
+            lines.append(f'  repeated x{count}: {shape}')
+        for sql, seconds in self.slow:
+            lines.append(f'  slow {seconds * 1000:.1f}ms: {sql}')
+        return '\n'.join(lines)
+
+
+class QueryInspectionMixin:
+    """
+    TestCase helper: ``with self.assertNoQueryProblems(): ...`` fails the test
+    if anything inside runs the same statement shape ``repeat_threshold`` times
+    (the usual N+1 signature) or a statement slower than ``slow_ms``.
+    """
+
+    @contextmanager
+    def assertNoQueryProblems(self, repeat_threshold=None, slow_ms=None):
+        with instrument_request(capture_sql=True) as stats:
+            yield stats
+        report = QueryReport(stats.statements, repeat_threshold, slow_ms)
+        if report:
+            self.fail(f'Query problems found:\n{report.format()}')
@@ -0,0 +1,115 @@
+import math
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+_RATE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([a-z]+)\s*$')
+_UNITS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60,
+          'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """``'100/10m'`` -> ``(100, 600)``; also accepts DRF's ``'100/day'``."""
+    match = _RATE.match(rate or '')
+    if not match or match.group(3) not in _UNITS:
+        raise ImproperlyConfigured(f'Invalid rate {rate!r}; use e.g. "100/m", "500/10m" or "1000/day"')
+    limit, multiplier, unit = match.groups()
+    return int(limit), int(multiplier or 1) * _UNITS[unit]
+
+
+class CacheBackend:
+    """
+    Counters in a Django cache. ``incr`` is atomic on the Redis, memcached and
+    local-memory backends, so this is safe under concurrency wherever the
+    cache is shared; with LocMemCache the limits are per process.
+    """
+
+    def __init__(self, alias='default', **kwargs):
+        self.cache = caches[alias]
+
+    def increment(self, key, previous_key, ttl):
+        try:
+            current = self.cache.incr(key)
+        except ValueError:
+            # First hit in this window. add() is a no-op if another request
+            # created the key first; then count this hit on top of theirs.
+            current = 1 if self.cache.add(key, 1, ttl) else self.cache.incr(key)
+        return current, self.cache.get(previous_key, 0)
+
+
+class RedisBackend:
+    """Counters in Redis, updated and read in one round trip by a Lua script."""
+
+    SCRIPT = """
+    local current = redis.call('INCR', KEYS[1])
+    if current == 1 then redis.call('EXPIRE', KEYS[1], ARGV[1]) end
+    return {current, tonumber(redis.call('GET', KEYS[2]) or '0')}
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', **kwargs):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def increment(self, key, previous_key, ttl):
+        current, previous = self.script(keys=[key, previous_key], args=[ttl])
+        return int(current), int(previous)
+
+
+BACKENDS = {'cache': CacheBackend, 'redis': RedisBackend}
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter: the previous fixed window's count, weighted by
+    how much of it still overlaps the sliding window, plus the current
+    window's count. Each hit is one atomic increment, so concurrent workers
+    can't both slip under the limit the way a get-then-set can.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def hit(self, key, limit, window):
+        """Count one request; returns ``(allowed, remaining, retry_after_seconds)``."""
+        now = time.time()
+        start = math.floor(now / window) * window
+        current, previous = self.backend.increment(
+            f'rl:{key}:{window}:{start}', f'rl:{key}:{window}:{start - window}', window * 2)
+        weight = (window - (now - start)) / window
+        estimate = previous * weight + current
+        if estimate <= limit:
+            return True, int(limit - estimate), 0
+        return False, 0, max(1, math.ceil(start + window - now))
+
+    async def ahit(self, key, limit, window):
+        """hit() for async callers; the backend round trip runs off the event loop."""
+        return await sync_to_async(self.hit, thread_sensitive=False)(key, limit, window)
+
+
+_limiter = None
+
+
+def get_limiter():
+    """The process-wide limiter for the configured RATE_LIMIT backend."""
+    global _limiter
+    if _limiter is None:
+        options = dict(settings.RATE_LIMIT)
+        name = options.pop('BACKEND', 'cache')
+        if name not in BACKENDS:
+            raise ImproperlyConfigured(f'Unknown RATE_LIMIT backend {name!r}; use one of {sorted(BACKENDS)}')
+        _limiter = SlidingWindowLimiter(BACKENDS[name](**{key.lower(): value for key, value in options.items()}))
+    return _limiter
+
+
+@receiver(setting_changed)
+def reset_limiter(setting, **kwargs):
+    global _limiter
+    if setting in ('RATE_LIMIT', 'CACHES'):
+        _limiter = None
@@ -0,0 +1,21 @@
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from .instrumentation import current_stats
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that adds its encoding time to the request's stats. Building
+    ``serializer.data`` is timed separately, by core.views.TimedSerializerMixin.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            stats = current_stats()
+            if stats is not None:
+                stats.render_seconds += time.perf_counter() - started
@@ -1,3 +1,240 @@
-from django.test import TestCase
+from datetime import date
 
-# Create your tests here.
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIHandler
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chat.consumers import ChatConsumer
+from chat.models import Message
+from trips.models import Trip, Poll, PollOption, Vote
+from users.models import User
+from .metrics import registry
+from .queryinspector import QueryInspectionMixin, QueryReport, normalize_sql
+from .ratelimit import CacheBackend, SlidingWindowLimiter, parse_rate
+from .throttling import UserRateThrottle
+
+
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Trip.objects.create(
+            title='Trip', destination='Quito', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+
+    def test_structured_log_line(self):
+        with self.assertLogs('core.middleware', level='INFO') as logs:
+            self.client.get('/api/trips/trips/')
+        record = next(r for r in logs.records if hasattr(r, 'request_metrics'))
+        metrics = record.request_metrics
+        self.assertEqual(metrics['route'], 'trip-list')
+        self.assertEqual(metrics['status'], 200)
+        self.assertGreater(metrics['db_queries'], 0)
+        self.assertGreater(metrics['bytes'], 0)
+        self.assertGreater(metrics['serialize_ms'], 0)
+        self.assertGreater(metrics['render_ms'], 0)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_exposes_histograms_by_route(self):
+        self.client.get('/api/trips/trips/')
+        self.client.get('/api/trips/trips/')
+        body = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_requests_total{route="trip-list",method="GET",status="200"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{route="trip-list",method="GET"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{route="trip-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn('http_request_db_queries_count{route="trip-list",method="GET"} 2', body)
+        self.assertIn('http_request_serialize_seconds_total{route="trip-list",method="GET"}', body)
+        self.assertIn('user_cache_hits_total', body)
+        self.assertIn('chat_outbound_queue_depth', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_without_token_is_closed_unless_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class QueryInspectorTest(QueryInspectionMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com')
+        for index in range(6):
+            trip = Trip.objects.create(
+                title=f'Trip {index}', destination='Lima', owner=cls.user,
+                start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+            )
+            poll = Poll.objects.create(trip=trip, question='Where?', created_by=cls.user)
+            option = PollOption.objects.create(poll=poll, text='Beach')
+            PollOption.objects.create(poll=poll, text='Hills')
+            Vote.objects.create(option=option, user=cls.user)
+            Message.objects.create(trip=trip, user=cls.user, content=f'hello {index}')
+        cls.trip = trip
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_normalize_sql_collapses_literals(self):
+        self.assertEqual(
+            normalize_sql('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'x\' LIMIT 21'),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+
+    def test_report_flags_repeated_and_slow(self):
+        statements = [('SELECT * FROM t WHERE id = %s', 0.001)] * 5 + [('SELECT 1', 0.5)]
+        report = QueryReport(statements, repeat_threshold=5, slow_ms=100)
+        self.assertEqual(report.repeated, {'SELECT * FROM t WHERE id = %s': 5})
+        self.assertEqual(report.slow, [('SELECT 1', 0.5)])
+
+    def test_assertion_catches_n_plus_one(self):
+        with self.assertRaises(AssertionError):
+            with self.assertNoQueryProblems():
+                for trip in Trip.objects.all():
+                    trip.owner.email
+
+    def test_trip_and_poll_lists_have_no_n_plus_one(self):
+        with self.assertNoQueryProblems():
+            self.client.get('/api/trips/trips/')
+            self.client.get('/api/trips/trips/', {'expand': 'owner,collaborators,bookings'})
+        with self.assertNoQueryProblems():
+            self.client.get('/api/trips/polls/', {'trip_id': self.trip.pk})
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_chat_consumer_has_no_n_plus_one(self):
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.trip.pk}/')
+            communicator.scope['url_route'] = {'kwargs': {'trip_id': str(self.trip.pk)}}
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await communicator.receive_json_from()
+            for index in range(6):
+                await communicator.send_json_to({'message': f'hi {index}'})
+                await communicator.receive_json_from()
+            await communicator.disconnect()
+
+        # Six sends are six identical INSERTs by design; allow them.
+        with self.assertNoQueryProblems(repeat_threshold=7):
+            async_to_sync(run)()
+
+    @override_settings(QUERY_INSPECTOR_ENABLED=True, DEBUG=True)
+    def test_middleware_reports_in_headers(self):
+        with self.assertLogs('core.middleware', level='INFO'):
+            response = self.client.get('/api/trips/trips/')
+        self.assertEqual(response['X-Query-Repeated'], '0')
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+
+class SlidingWindowLimiterTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.limiter = SlidingWindowLimiter(CacheBackend())
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('100/m'), (100, 60))
+        self.assertEqual(parse_rate('500/10m'), (500, 600))
+        self.assertEqual(parse_rate('1000/day'), (1000, 86400))
+        with self.assertRaises(ImproperlyConfigured):
+            parse_rate('lots')
+
+    def test_limit_and_retry_after(self):
+        results = [self.limiter.hit('client', 3, 60) for _ in range(4)]
+        self.assertEqual([allowed for allowed, _, _ in results], [True, True, True, False])
+        self.assertEqual(results[0][1], 2)
+        self.assertGreaterEqual(results[-1][2], 1)
+        self.assertTrue(self.limiter.hit('other-client', 3, 60)[0])
+
+    def test_concurrent_hits_are_counted_once_each(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: self.limiter.hit('client', 20, 60)[0], range(50)))
+        self.assertEqual(results.count(True), 20)
+
+
+@override_settings(RATE_LIMIT_DEFAULT='3/m', RATE_LIMIT_ROUTES={'token_obtain_pair': '1/m'})
+class RateLimitMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='owner@example.com')
+
+    def test_default_limit_per_client(self):
+        statuses = [self.client.get('/api/trips/trips/').status_code for _ in range(4)]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+        response = self.client.get('/api/trips/trips/')
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+        # An authenticated user has their own budget.
+        token = AccessToken.for_user(self.user)
+        response = self.client.get('/api/trips/trips/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_route_limit(self):
+        statuses = [
+            self.client.post('/api/users/login/', {'email': 'x@example.com', 'password': 'x'}).status_code
+            for _ in range(2)
+        ]
+        self.assertEqual(statuses, [401, 429])
+        # Other routes still have the default budget.
+        self.assertEqual(self.client.get('/api/trips/trips/').status_code, 401)
+
+    @override_settings(RATE_LIMIT={'BACKEND': 'cache', 'ALIAS': 'missing'})
+    def test_fails_open_when_backend_is_unavailable(self):
+        with self.assertLogs('core.middleware', level='ERROR'):
+            response = self.client.get('/api/trips/trips/')
+        self.assertEqual(response.status_code, 401)
+
+
+class ThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_user_throttle_uses_shared_limiter(self):
+        class TwoPerMinute(UserRateThrottle):
+            rate = '2/m'
+
+        request = APIRequestFactory().get('/')
+        request.user = User.objects.create_user(email='owner@example.com')
+        results = [TwoPerMinute().allow_request(request, None) for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+
+        throttle = TwoPerMinute()
+        throttle.allow_request(request, None)
+        self.assertGreaterEqual(throttle.wait(), 1)
+
+
+class AsyncMiddlewareTest(TestCase):
+    @override_settings(DEBUG=True, QUERY_INSPECTOR_ENABLED=True)
+    def test_asgi_chain_needs_no_thread_hops(self):
+        # Django logs every sync/async adaptation it has to make when DEBUG is on.
+        with self.assertNoLogs('django.request', level='DEBUG'):
+            ASGIHandler().load_middleware(is_async=True)
+
+    @override_settings(RATE_LIMIT_DEFAULT='2/m')
+    async def test_rate_limit_and_logging_under_asgi(self):
+        await database_sync_to_async(cache.clear)()
+        user = await User.objects.acreate(email='owner@example.com')
+        auth = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        with self.assertLogs('core.middleware', level='INFO') as logs:
+            statuses = [
+                (await self.async_client.get('/api/trips/async/trips/', headers=auth)).status_code for _ in range(3)
+            ]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertIn('INFO:core.middleware:Authenticated request by: owner@example.com', logs.output)
+        record = next(r for r in logs.records if hasattr(r, 'request_metrics'))
+        self.assertEqual(record.request_metrics['route'], 'trip-list-async')
@@ -0,0 +1,62 @@
+import logging
+
+from rest_framework import throttling
+
+from .ratelimit import get_limiter, parse_rate
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowThrottleMixin:
+    """
+    Runs a DRF throttle on the shared sliding-window limiter instead of the
+    stock get-then-set request history, so throttles are atomic and share the
+    RATE_LIMIT backend with RateLimitMiddleware.
+    """
+
+    def parse_rate(self, rate):
+        if rate is None:
+            return None, None
+        return parse_rate(rate)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        try:
+            allowed, _, self.retry_after = get_limiter().hit(self.key, self.num_requests, self.duration)
+        except Exception:
+            logger.exception('Rate limit backend unavailable; allowing request')
+            return True
+        return allowed
+
+    async def aallow_request(self, request, view):
+        """allow_request() for async views."""
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        try:
+            allowed, _, self.retry_after = await get_limiter().ahit(self.key, self.num_requests, self.duration)
+        except Exception:
+            logger.exception('Rate limit backend unavailable; allowing request')
+            return True
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnonRateThrottle(SlidingWindowThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(SlidingWindowThrottleMixin, throttling.UserRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(SlidingWindowThrottleMixin, throttling.ScopedRateThrottle):
+    pass
@@ -1,3 +1,87 @@
-from django.shortcuts import render
+from collections import OrderedDict
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.http.response import HttpResponseBase
+from django.utils.crypto import constant_time_compare
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+
+from users.authentication import CachedJWTAuthentication
+from .instrumentation import timed_serializer
+from .metrics import registry
+from .renderers import TimedJSONRenderer
+from .throttling import UserRateThrottle
+
+
+class TimedSerializerMixin:
+    """Generic views: time building ``serializer.data`` for the request metrics."""
+
+    def get_serializer(self, *args, **kwargs):
+        return timed_serializer(super().get_serializer(*args, **kwargs))
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint, guarded by METRICS_TOKEN. Without a token it is
+    only open under DEBUG.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class AsyncReadView(View):
+    """
+    Base for async, read-only JSON endpoints. Authenticates and throttles like
+    the REST API (JWT through the user cache, the shared rate limiter), then
+    passes handlers a DRF Request so serializers and pagination work as usual
+    while queries go through the async ORM.
+
+    Handlers return the response data; errors are raised as DRF exceptions.
+    """
+    authentication_class = CachedJWTAuthentication
+    throttle_classes = (UserRateThrottle,)
+    pagination_class = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request)
+        try:
+            auth = await self.authentication_class().aauthenticate(request)
+            if auth is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = auth
+            for throttle in (throttle_class() for throttle_class in self.throttle_classes):
+                if not await throttle.aallow_request(request, self):
+                    raise exceptions.Throttled(throttle.wait())
+            data = await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = self.render({'detail': exc.detail}, exc.status_code)
+            if isinstance(exc, exceptions.NotAuthenticated):
+                response['WWW-Authenticate'] = self.authentication_class().authenticate_header(request)
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = str(exc.wait)
+            return response
+        if isinstance(data, HttpResponseBase):
+            return data
+        return self.render(data)
+
+    def render(self, data, status=200):
+        return HttpResponse(TimedJSONRenderer().render(data), status=status, content_type='application/json')
+
+    async def list(self, request, queryset, serializer_class):
+        """Serialize ``queryset``, keyset-paginated when the request asks for it."""
+        context = {'request': request}
+        paginator = self.pagination_class() if self.pagination_class else None
+        page = await paginator.apaginate_queryset(queryset, request, self) if paginator else None
+        if page is None:
+            return timed_serializer(serializer_class([row async for row in queryset], many=True, context=context)).data
+        return OrderedDict([
+            ('next', paginator.get_next_link()),
+            ('results', timed_serializer(serializer_class(page, many=True, context=context)).data),
+        ])
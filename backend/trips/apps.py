@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class TripsConfig(AppConfig):
     name = 'trips'
+
+    def ready(self):
+        from core.metrics import registry
+        from . import signals  # noqa: F401
+        from .cache import response_cache
+        registry.register_collector(response_cache.collect_metrics)
@@ -0,0 +1,72 @@
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Serialized trip responses in the RESPONSE_CACHE_ALIAS cache, keyed by the
+    trip's version stamp. Every write to a trip or its children bumps the
+    version, so a changed trip simply stops matching its old entries; nothing
+    is deleted and nothing stale is served. Old entries age out with the TTL.
+
+    Cache errors are logged and treated as misses.
+    """
+
+    def __init__(self, alias='responses', ttl=300):
+        self.alias = alias
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(seed, variant):
+        """``seed`` is ``trip_id:version:role``; ``variant`` is whatever else shapes the response."""
+        digest = hashlib.sha1(variant.encode('utf-8')).hexdigest()
+        return f'trip-response:{seed}:{digest}'
+
+    def get(self, key):
+        try:
+            data = caches[self.alias].get(key)
+        except Exception:
+            logger.exception('Response cache unavailable')
+            data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, key, data):
+        try:
+            caches[self.alias].set(key, data, self.ttl)
+        except Exception:
+            logger.exception('Response cache unavailable')
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def collect_metrics(self):
+        """Counters for core.metrics."""
+        return [
+            ('trip_response_cache_hits_total', 'counter', 'Trip responses served from cache.', self.hits),
+            ('trip_response_cache_misses_total', 'counter', 'Trip responses rendered from the database.', self.misses),
+        ]
+
+
+response_cache = ResponseCache(
+    alias=getattr(settings, 'RESPONSE_CACHE_ALIAS', 'responses'),
+    ttl=getattr(settings, 'RESPONSE_CACHE_TTL', 300),
+)
@@ -0,0 +1,69 @@
+import asyncio
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from django.conf import settings
+from .events import trip_group
+from .models import TripMembership
+
+
+class TripEventConsumer(AsyncWebsocketConsumer):
+    """
+    Live change feed for one trip. Pushes ``{"type": "changes", "changes":
+    [{"model", "id", "op"}, ...]}`` frames so clients refetch only what moved
+    instead of polling. Changes arriving within ``TRIP_EVENTS_COALESCE_MS`` go
+    out as one frame, with repeated edits to the same row collapsed.
+    """
+
+    async def connect(self):
+        self.trip_id = int(self.scope['url_route']['kwargs']['trip_id'])
+        self.group_name = trip_group(self.trip_id)
+        self.user = self.scope['user']
+
+        self.role = await self.get_membership_role()
+        if self.role is None:
+            await self.close()
+            return
+
+        self.pending = {}
+        self.flusher = None
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'role', None) is None:
+            return
+        if self.flusher is not None:
+            self.flusher.cancel()
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data):
+        # The feed is server-to-client only; writes go through the REST API.
+        pass
+
+    async def trip_changes(self, event):
+        for change in event['changes']:
+            # Later ops win, so an edit followed by a delete is sent as a delete.
+            self.pending[(change['model'], change['id'])] = change
+        if self.flusher is None:
+            self.flusher = asyncio.ensure_future(self.flush_later())
+
+    async def trip_member_removed(self, event):
+        # Access was checked at connect; stop the feed once this member is removed.
+        if event['user_id'] != self.user.pk:
+            return
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await self.close(code=4003)
+
+    async def flush_later(self):
+        await asyncio.sleep(settings.TRIP_EVENTS_COALESCE_MS / 1000)
+        changes, self.pending, self.flusher = list(self.pending.values()), {}, None
+        await self.send(text_data=json.dumps({'type': 'changes', 'changes': changes}))
+
+    @database_sync_to_async
+    def get_membership_role(self):
+        if not self.user.is_authenticated or not self.user.is_active:
+            return None
+        return TripMembership.objects.filter(
+            trip_id=self.trip_id, user=self.user
+        ).values_list('role', flat=True).first()
@@ -0,0 +1,61 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def trip_group(trip_id):
+    return f'trip_{trip_id}'
+
+
+def row_change(instance, op='upsert'):
+    """The compact delta for one row: which model, which id, and whether it's gone."""
+    return {'model': instance._meta.model_name, 'id': instance.pk, 'op': op}
+
+
+def publish_changes(trip_id, changes):
+    """
+    Record ``changes`` in the sync log and push them to the trip's event group
+    once the current transaction commits. The log rows are written in the same
+    transaction as the change itself, so both roll back together; listeners
+    never see rolled back rows. Feed delivery is best effort: a channel layer
+    outage is logged, never raised into the write.
+    """
+    if not changes:
+        return
+
+    from .models import SyncChange
+    SyncChange.objects.bulk_create([
+        SyncChange(trip_id=trip_id, model=change['model'], object_id=change['id'], op=change['op'])
+        for change in changes
+    ])
+
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(
+                trip_group(trip_id), {'type': 'trip.changes', 'changes': changes})
+        except Exception:
+            logger.exception('Could not publish %d change(s) for trip %s', len(changes), trip_id)
+
+    transaction.on_commit(send)
+
+
+def publish_member_removed(trip_id, user_id):
+    """Once the removal commits, tell the member's open feeds for the trip to close."""
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(
+                trip_group(trip_id), {'type': 'trip.member_removed', 'user_id': user_id})
+        except Exception:
+            logger.exception('Could not publish member removal for trip %s', trip_id)
+
+    transaction.on_commit(send)
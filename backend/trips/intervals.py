@@ -0,0 +1,25 @@
+import heapq
+
+
+def find_overlaps(intervals):
+    """
+    Return every overlapping pair of ``(key, start, end)`` intervals as
+    ``(earlier_key, later_key, overlap_start, overlap_end)``.
+
+    ``intervals`` must be sorted by start. A sweep keeps a min-heap of the
+    intervals still open at the current start, so the cost is O(n log n) plus
+    the number of overlaps reported. Intervals that only touch (one ends
+    exactly when the next starts) do not overlap; intervals that end before
+    they start are ignored.
+    """
+    active = []
+    overlaps = []
+    for index, (key, start, end) in enumerate(intervals):
+        if end < start:
+            continue
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for other_end, _, other_key in active:
+            overlaps.append((other_key, key, start, min(end, other_end)))
+        heapq.heappush(active, (end, index, key))
+    return overlaps
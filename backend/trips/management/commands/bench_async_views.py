@@ -0,0 +1,101 @@
+import asyncio
+import itertools
+import statistics
+import time
+from datetime import date
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chat.models import Message
+from trips.models import Trip, TripMembership, Booking
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Requests/sec for the sync (DRF) and async read endpoints under concurrency: trip list, trip detail '
+        'and chat history, each driven through the full ASGI middleware stack with AsyncClient. '
+        'Requests are spread over --users members so the rate limits are not the bottleneck. '
+        'Creates its own users, trips and messages in the configured database and deletes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--trips', type=int, default=10)
+        parser.add_argument('--messages', type=int, default=200, help='Chat messages per trip.')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, **options):
+        # Trip changes publish to the channel layer; keep the run off Redis.
+        with override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}):
+            self.bench(**options)
+
+    def bench(self, users, trips, messages, requests, concurrency, **kwargs):
+        members = User.objects.bulk_create([
+            User(email=f'bench-async-{index}@example.invalid') for index in range(users)
+        ])
+        created = [
+            Trip.objects.create(
+                title=f'Async benchmark {index}', destination='Nowhere', owner=members[0],
+                start_date=date.today(), end_date=date.today(),
+            )
+            for index in range(trips)
+        ]
+        try:
+            TripMembership.objects.bulk_create([
+                TripMembership(trip=trip, user=user, role='editor') for trip in created for user in members[1:]
+            ])
+            Booking.objects.bulk_create([
+                Booking(trip=trip, user=members[0], destination='Nowhere') for trip in created
+            ])
+            Message.objects.bulk_create([
+                Message(trip=trip, user=members[0], content=f'message {index}')
+                for trip in created for index in range(messages)
+            ])
+            trip = created[0]
+            endpoints = [
+                ('trip list', '/api/trips/trips/', '/api/trips/async/trips/', {}),
+                ('trip detail', f'/api/trips/trips/{trip.pk}/', f'/api/trips/async/trips/{trip.pk}/', {}),
+                ('chat history', '/api/chat/history/', '/api/chat/history/async/',
+                 {'trip_id': trip.pk, 'page_size': 50}),
+            ]
+            tokens = [f'Bearer {AccessToken.for_user(user)}' for user in members]
+            results = async_to_sync(self.run)(endpoints, tokens, requests, concurrency)
+        finally:
+            Trip.objects.filter(pk__in=[trip.pk for trip in created]).delete()
+            User.objects.filter(pk__in=[user.pk for user in members]).delete()
+
+        self.stdout.write(f'{requests} requests per endpoint, concurrency {concurrency}')
+        self.stdout.write(f'{"endpoint":<14}{"mode":<7}{"req/s":>9}{"p50 ms":>9}{"p99 ms":>9}')
+        for name, mode, rate, p50, p99 in results:
+            self.stdout.write(f'{name:<14}{mode:<7}{rate:>9.0f}{p50:>9.1f}{p99:>9.1f}')
+
+    async def run(self, endpoints, tokens, requests, concurrency):
+        client = AsyncClient()
+        auth = itertools.cycle(tokens)
+        results = []
+        for name, sync_url, async_url, params in endpoints:
+            for mode, url in (('sync', sync_url), ('async', async_url)):
+                # One untimed request so URL resolution and imports are warm.
+                await client.get(url, params, headers={'Authorization': tokens[0]})
+                latencies = []
+                slots = asyncio.Semaphore(concurrency)
+
+                async def request(token):
+                    async with slots:
+                        started = time.perf_counter()
+                        response = await client.get(url, params, headers={'Authorization': token})
+                        latencies.append(time.perf_counter() - started)
+                        if response.status_code != 200:
+                            raise CommandError(f'{mode} {name}: HTTP {response.status_code}')
+
+                started = time.perf_counter()
+                await asyncio.gather(*(request(next(auth)) for _ in range(requests)))
+                elapsed = time.perf_counter() - started
+                cuts = statistics.quantiles(latencies, n=100)
+                results.append((name, mode, requests / elapsed, cuts[49] * 1000, cuts[98] * 1000))
+        return results
@@ -0,0 +1,60 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from trips.models import Trip, Poll, PollOption, Vote
+from trips.views import PollViewSet
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure queries and wall time of the poll list endpoint as the number of '
+        'polls grows. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 200],
+                            help='Poll counts to benchmark.')
+        parser.add_argument('--options', type=int, default=5, help='Options per poll.')
+        parser.add_argument('--voters', type=int, default=10, help='Users voting on every poll.')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per size; the best time is reported.')
+
+    def handle(self, *args, sizes, options, voters, repeat, **kwargs):
+        view = PollViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+
+        self.stdout.write(f'{"polls":>8} {"queries":>8} {"best ms":>10}')
+        with transaction.atomic():
+            users = [User.objects.create(email=f'bench-voter-{index}@example.invalid') for index in range(voters)]
+            trip = Trip.objects.create(
+                title='Poll benchmark', destination='Nowhere', owner=users[0],
+                start_date=date.today(), end_date=date.today(),
+            )
+            created = 0
+            for size in sorted(sizes):
+                for _ in range(size - created):
+                    poll = Poll.objects.create(trip=trip, question='Where next?', created_by=users[0])
+                    poll_options = PollOption.objects.bulk_create(
+                        [PollOption(poll=poll, text=f'Option {index}') for index in range(options)])
+                    Vote.objects.bulk_create(
+                        [Vote(poll=poll, option=poll_options[index % options], user=user) for index, user in enumerate(users)])
+                created = size
+
+                best, queries = None, None
+                for _ in range(repeat):
+                    request = factory.get('/api/trips/polls/', {'trip_id': trip.pk})
+                    force_authenticate(request, user=users[0])
+                    with CaptureQueriesContext(connection) as ctx:
+                        started = time.perf_counter()
+                        view(request).render()
+                        elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                    queries = len(ctx.captured_queries)
+                self.stdout.write(f'{size:>8} {queries:>8} {best * 1000:>10.1f}')
+
+            transaction.set_rollback(True)
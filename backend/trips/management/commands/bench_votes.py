@@ -0,0 +1,84 @@
+import random
+import threading
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Count
+
+from trips.models import Trip, Poll, PollOption, Vote
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Concurrent load test for Poll.cast_vote: several threads hammer one poll '
+        'with vote changes, then the tallies are checked for double votes. '
+        'Creates its own users and trip in the configured database and deletes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--votes', type=int, default=200, help='Votes cast per thread.')
+        parser.add_argument('--options', type=int, default=4)
+
+    def handle(self, *args, threads, users, votes, options, **kwargs):
+        voters = [User.objects.create(email=f'bench-vote-{index}@example.invalid') for index in range(users)]
+        trip = Trip.objects.create(
+            title='Vote benchmark', destination='Nowhere', owner=voters[0],
+            start_date=date.today(), end_date=date.today(),
+        )
+        try:
+            poll = Poll.objects.create(trip=trip, question='Where next?', created_by=voters[0])
+            choices = [PollOption.objects.create(poll=poll, text=f'Option {index}') for index in range(options)]
+            retries = [0] * threads
+            errors = []
+
+            def worker(slot):
+                rng = random.Random(slot)
+                try:
+                    for _ in range(votes):
+                        user, option = rng.choice(voters), rng.choice(choices)
+                        while True:
+                            try:
+                                poll.cast_vote(user, option)
+                                break
+                            except OperationalError:
+                                # SQLite serialises writers; back off and retry.
+                                retries[slot] += 1
+                                time.sleep(0.001)
+                except Exception as exc:
+                    errors.append(exc)
+                finally:
+                    connection.close()
+
+            workers = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+            started = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            if errors:
+                raise CommandError(f'{len(errors)} worker(s) failed: {errors[0]!r}')
+
+            doubles = (
+                Vote.objects.filter(poll=poll).values('user').annotate(n=Count('id')).filter(n__gt=1).count()
+            )
+            total = Vote.objects.filter(poll=poll).count()
+            tallied = sum(option.vote_count for option in PollOption.objects.filter(poll=poll).with_tallies(voters[0]))
+            voted = Vote.objects.filter(poll=poll).values('user').distinct().count()
+
+            cast = threads * votes
+            self.stdout.write(f'{cast} votes from {threads} threads in {elapsed:.2f}s '
+                              f'({cast / elapsed:.0f} votes/sec, {sum(retries)} lock retries)')
+            self.stdout.write(f'rows={total} voters={voted} tallied={tallied} double_votes={doubles}')
+            if doubles or total != voted or tallied != total:
+                raise CommandError('Tallies are inconsistent')
+            self.stdout.write(self.style.SUCCESS('Tallies consistent'))
+        finally:
+            trip.delete()
+            User.objects.filter(pk__in=[voter.pk for voter in voters]).delete()
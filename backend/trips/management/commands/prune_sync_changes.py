@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from trips.models import SyncChange
+
+
+class Command(BaseCommand):
+    help = 'Delete sync change-log rows older than SYNC_RETENTION_DAYS; clients holding older tokens resync in full.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Override SYNC_RETENTION_DAYS.')
+
+    def handle(self, *args, days, **kwargs):
+        days = settings.SYNC_RETENTION_DAYS if days is None else days
+        cutoff = timezone.now() - timedelta(days=days)
+        deleted, _ = SyncChange.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} sync change(s) older than {days} day(s).'))
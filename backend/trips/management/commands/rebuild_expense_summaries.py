@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from trips.models import ExpenseCategorySummary, ExpenseDailySummary
+from trips.summaries import rebuild_expense_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-category and per-day expense summaries from the Expense table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trip', type=int, action='append', dest='trip_ids',
+                            help='Only rebuild this trip (repeatable). Defaults to every trip.')
+
+    def handle(self, *args, trip_ids=None, **options):
+        rebuild_expense_summaries(trip_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {ExpenseCategorySummary.objects.count()} category and '
+            f'{ExpenseDailySummary.objects.count()} daily summary rows.'
+        ))
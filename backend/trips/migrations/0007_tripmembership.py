@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_memberships(apps, schema_editor):
+    Trip = apps.get_model('trips', 'Trip')
+    Collaborator = apps.get_model('trips', 'Collaborator')
+    TripMembership = apps.get_model('trips', 'TripMembership')
+
+    memberships = {
+        (trip_id, owner_id): 'owner'
+        for trip_id, owner_id in Trip.objects.values_list('id', 'owner_id').iterator()
+    }
+    for trip_id, user_id, role in Collaborator.objects.values_list('trip_id', 'user_id', 'role').iterator():
+        memberships.setdefault((trip_id, user_id), role)
+
+    TripMembership.objects.bulk_create(
+        [TripMembership(trip_id=trip_id, user_id=user_id, role=role) for (trip_id, user_id), role in memberships.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0006_trip_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('owner', 'Owner'), ('editor', 'Editor'), ('viewer', 'Viewer')], max_length=10)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='trips.trip')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trip_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'trip')},
+            },
+        ),
+        migrations.RunPython(backfill_memberships, migrations.RunPython.noop),
+    ]
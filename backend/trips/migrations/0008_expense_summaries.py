@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_summaries(apps, schema_editor):
+    Expense = apps.get_model('trips', 'Expense')
+    ExpenseCategorySummary = apps.get_model('trips', 'ExpenseCategorySummary')
+    ExpenseDailySummary = apps.get_model('trips', 'ExpenseDailySummary')
+
+    by_category = Expense.objects.values('trip_id', 'category').annotate(total=Sum('amount'), count=Count('id')).order_by()
+    by_day = (
+        Expense.objects.annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        .values('trip_id', 'day').annotate(total=Sum('amount'), count=Count('id')).order_by()
+    )
+    ExpenseCategorySummary.objects.bulk_create([ExpenseCategorySummary(**row) for row in by_category], batch_size=1000)
+    ExpenseDailySummary.objects.bulk_create([ExpenseDailySummary(**row) for row in by_day], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0007_tripmembership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseCategorySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=100)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_category_summaries', to='trips.trip')),
+            ],
+            options={
+                'unique_together': {('trip', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ExpenseDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_daily_summaries', to='trips.trip')),
+            ],
+            options={
+                'unique_together': {('trip', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_vote_poll(apps, schema_editor):
+    Vote = apps.get_model('trips', 'Vote')
+    PollOption = apps.get_model('trips', 'PollOption')
+
+    # Keep only each user's most recent vote per poll before the new
+    # (poll, user) constraint is added; the old view could leave doubles.
+    latest = {}
+    duplicates = []
+    for vote_id, poll_id, user_id in (
+        Vote.objects.order_by('created_at', 'id').values_list('id', 'option__poll_id', 'user_id').iterator()
+    ):
+        previous = latest.get((poll_id, user_id))
+        if previous is not None:
+            duplicates.append(previous)
+        latest[(poll_id, user_id)] = vote_id
+    Vote.objects.filter(id__in=duplicates).delete()
+
+    Vote.objects.update(poll_id=Subquery(PollOption.objects.filter(pk=OuterRef('option_id')).values('poll_id')[:1]))
+
+
+class Migration(migrations.Migration):
+    # On PostgreSQL the new FK is deferrable, so rewriting votes leaves
+    # pending trigger events that block the ALTER TABLEs below within one
+    # transaction. Run each operation in its own transaction instead; the
+    # data step stays atomic on its own.
+    atomic = False
+
+    dependencies = [
+        ('trips', '0008_expense_summaries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='poll',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='trips.poll'),
+        ),
+        migrations.RunPython(populate_vote_poll, migrations.RunPython.noop, atomic=True),
+        migrations.AlterField(
+            model_name='vote',
+            name='poll',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='trips.poll'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vote',
+            unique_together={('poll', 'user')},
+        ),
+    ]
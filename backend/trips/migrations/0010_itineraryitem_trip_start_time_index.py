@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0009_vote_poll'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='itineraryitem',
+            index=models.Index(fields=['trip', 'start_time'], name='trips_itine_trip_id_782815_idx'),
+        ),
+    ]
@@ -0,0 +1,263 @@
+import hashlib
+
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .cache import response_cache
+from .events import publish_changes, row_change
+from .models import Trip
+from .signals import defer_rollups
+
+
+class ConditionalGetMixin:
+    """
+    Answers ``If-None-Match`` / ``If-Modified-Since`` from the per-trip version
+    stamp, so unchanged resources get a 304 without running the serializers.
+
+    Views provide ``get_version_stamp()``, which returns a ``(seed, last_modified)``
+    pair from a cheap query, or ``None`` when the request can't be stamped.
+
+    For ``cached_actions`` the stamp must cover a single trip, as
+    ``trip_id:version:role``; the response data is then kept in the trip
+    response cache under that seed, so a 200 skips the serializers too.
+    """
+    conditional_actions = ('list', 'retrieve')
+    cached_actions = ()
+    # Set when the representation differs per user, not just per role.
+    cache_per_user = False
+
+    def get_version_stamp(self):
+        return None
+
+    def get_etag(self, seed):
+        # The representation depends on the caller (membership, has_voted) and
+        # on the query string (fields, expand, cursor), not just the data.
+        raw = f'{seed}|{self.request.user.pk}|{self.request.get_full_path()}'
+        return quote_etag(hashlib.sha1(raw.encode('utf-8')).hexdigest())
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        stamp = self.get_version_stamp()
+        if stamp is None:
+            return handler(request, *args, **kwargs)
+
+        seed, modified_at = stamp
+        etag = self.get_etag(seed)
+        last_modified = int(modified_at.timestamp()) if modified_at else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.cached_response(handler, seed, modified_at, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def cached_response(self, handler, seed, modified_at, request, *args, **kwargs):
+        if self.action not in self.cached_actions:
+            return handler(request, *args, **kwargs)
+        # The absolute URI covers the query string and the host in ``next``
+        # links; modified_at keeps a reused trip id from matching old entries.
+        user = request.user.pk if self.cache_per_user else ''
+        variant = f'{modified_at.isoformat() if modified_at else ""}|{user}|{request.build_absolute_uri()}'
+        key = response_cache.make_key(seed, variant)
+        data = response_cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(key, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if 'list' not in self.conditional_actions:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' not in self.conditional_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+
+class TripMemberScopedMixin:
+    """
+    Scopes a trip child viewset to trips the caller is a member of. Lists still
+    require ``?trip_id=``; detail routes resolve through membership alone.
+    """
+
+    def scope_to_member_trips(self, queryset):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none()
+        queryset = queryset.filter(trip__memberships__user=user)
+        trip_id = self.request.query_params.get('trip_id')
+        if trip_id:
+            return queryset.filter(trip_id=trip_id)
+        if self.detail:
+            return queryset
+        return queryset.none()
+
+
+class TripChildConditionalGetMixin(ConditionalGetMixin):
+    """
+    Stamps the ``?trip_id=`` scoped child viewsets with the parent trip's
+    version. ``trip_relation`` is the reverse accessor from Trip to the child.
+    """
+    trip_relation = None
+
+    def get_version_stamp(self):
+        if self.action == 'retrieve':
+            pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            if not str(pk).isdigit():
+                return None
+            trips = Trip.objects.filter(**{self.trip_relation: pk})
+        else:
+            trip_id = self.request.query_params.get('trip_id')
+            if not trip_id or not trip_id.isdigit():
+                return None
+            trips = Trip.objects.filter(pk=trip_id)
+
+        stamp = (
+            trips.accessible_to(self.request.user)
+            .values_list('pk', 'version', 'updated_at', 'memberships__role').first()
+        )
+        if stamp is None:
+            return None
+        trip_id, version, updated_at, role = stamp
+        return f'{trip_id}:{version}:{role}', updated_at
+
+
+class BatchWriteMixin:
+    """
+    Adds ``POST batch/``: apply many creates, updates and deletes to one trip's
+    rows in a single request and transaction.
+
+    Body: ``{"trip": id, "create": [{...}], "update": [{"id": id, ...}], "delete": [id]}``.
+    Everything is validated up front and written with bulk_create/bulk_update;
+    if any item fails, nothing is written and the response lists per-item
+    errors in the same positions as the request.
+    """
+    batch_max_items = 500
+
+    def batch_committed(self, trip):
+        """Hook for rollups that the per-row signals would normally maintain."""
+
+    def batch_before_create(self, trip, new_objects):
+        """Hook to fill in fields on the new rows, inside the batch transaction."""
+
+    def validate_batch(self, trip, new_objects, changed_objects, deletes):
+        """
+        Hook for checks across the whole batch, run once every item is valid on
+        its own. Returns ``{'create': {index: error}, 'update': {index: error}}``
+        for the items that fail.
+        """
+        return {}
+
+    def _batch_input_serializer(self, trip, *args, **kwargs):
+        # Serializers see the envelope's trip and know they are part of a
+        # batch, so cross-item checks can wait for validate_batch().
+        kwargs['context'] = {**self.get_serializer_context(), 'trip': trip, 'batch': True}
+        serializer = self.get_serializer(*args, **kwargs)
+        # The trip comes from the envelope; dropping the field also saves one
+        # lookup per item.
+        serializer.fields.pop('trip', None)
+        return serializer
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Body must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+        trip_id = request.data.get('trip')
+        if not str(trip_id).isdigit():
+            return Response({'error': 'trip is required'}, status=status.HTTP_400_BAD_REQUEST)
+        trip = get_object_or_404(Trip.objects.accessible_to(request.user), pk=trip_id)
+
+        creates = request.data.get('create', [])
+        updates = request.data.get('update', [])
+        deletes = request.data.get('delete', [])
+        if not all(isinstance(value, list) for value in (creates, updates, deletes)):
+            return Response({'error': 'create, update and delete must be lists'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(creates) + len(updates) + len(deletes) > self.batch_max_items:
+            return Response({'error': f'At most {self.batch_max_items} items per batch'}, status=status.HTTP_400_BAD_REQUEST)
+
+        update_ids = [item.get('id') for item in updates if isinstance(item, dict)]
+        if not all(isinstance(pk, int) for pk in update_ids + deletes):
+            return Response({'error': 'Item ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.get_serializer_class().Meta.model
+        rows = model.objects.filter(trip=trip)
+        existing = rows.in_bulk(update_ids + deletes)
+
+        errors = {'create': [], 'update': [], 'delete': []}
+        new_objects = []
+        for item in creates:
+            serializer = self._batch_input_serializer(trip, data=item)
+            if serializer.is_valid():
+                new_objects.append(model(trip=trip, **serializer.validated_data))
+                errors['create'].append({})
+            else:
+                errors['create'].append(serializer.errors)
+
+        changed_objects, changed_fields = [], set()
+        for item in updates:
+            instance = existing.get(item.get('id')) if isinstance(item, dict) else None
+            if instance is None:
+                errors['update'].append({'id': ['Not found in this trip.']})
+                continue
+            serializer = self._batch_input_serializer(trip, instance, data=item, partial=True)
+            if serializer.is_valid():
+                for field, value in serializer.validated_data.items():
+                    setattr(instance, field, value)
+                changed_fields.update(serializer.validated_data)
+                changed_objects.append(instance)
+                errors['update'].append({})
+            else:
+                errors['update'].append(serializer.errors)
+
+        for pk in deletes:
+            if pk not in existing:
+                errors['delete'].append({'id': ['Not found in this trip.']})
+            elif pk in update_ids:
+                errors['delete'].append({'id': ['Also listed in update.']})
+            else:
+                errors['delete'].append({})
+
+        if any(error for results in errors.values() for error in results):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        batch_errors = self.validate_batch(trip, new_objects, changed_objects, deletes)
+        if any(batch_errors.values()):
+            for key, failures in batch_errors.items():
+                for index, error in failures.items():
+                    errors[key][index] = error
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            with defer_rollups():
+                self.batch_before_create(trip, new_objects)
+                created = model.objects.bulk_create(new_objects)
+                if changed_objects and changed_fields:
+                    model.objects.bulk_update(changed_objects, list(changed_fields))
+                if deletes:
+                    rows.filter(pk__in=deletes).delete()
+            self.batch_committed(trip)
+            Trip.objects.filter(pk=trip.pk).bump_version()
+            publish_changes(trip.pk, (
+                [row_change(instance) for instance in created + changed_objects]
+                + [{'model': model._meta.model_name, 'id': pk, 'op': 'delete'} for pk in deletes]
+            ))
+
+        return Response({
+            'created': self.get_serializer(created, many=True).data,
+            'updated': self.get_serializer(changed_objects, many=True).data,
+            'deleted': deletes,
+        })
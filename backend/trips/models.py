@@ -1,5 +1,20 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
+
+from .events import publish_changes
+
+class TripQuerySet(models.QuerySet):
+    def bump_version(self):
+        """
+        Mark these trips as changed. Called whenever a trip or one of its child
+        rows is written so version-based ETags and caches go stale in O(1).
+        """
+        return self.update(version=models.F('version') + 1, updated_at=timezone.now())
+
+    def accessible_to(self, user):
+        """Trips the user owns or collaborates on, via the membership index."""
+        return self.filter(memberships__user=user)
 
 class Trip(models.Model):
     title = models.CharField(max_length=255)
@@ -12,10 +27,31 @@ class Trip(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='owned_trips')
     image = models.ImageField(upload_to='trips/', null=True, blank=True)
     budget = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Advanced on every change to the trip or any of its child rows.
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TripQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        # Increment in SQL so a concurrent child-row bump is never overwritten
+        # by the stale value loaded into this instance.
+        previous = self.__dict__.get('version')
+        self.version = models.F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        # Mirror the increment locally instead of re-reading the row; a
+        # version that was never loaded is left deferred.
+        if isinstance(previous, int):
+            self.version = previous + 1
+        else:
+            del self.__dict__['version']
+
 class Expense(models.Model):
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='expenses')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -26,6 +62,33 @@ class Expense(models.Model):
     def __str__(self):
         return f"{self.name}: {self.amount}"
 
+    def save(self, *args, **kwargs):
+        # The summary signals run inside save(); keep them in the same
+        # transaction so a failure can't leave the totals out of step.
+        # Deletes already run their signals inside the collector's transaction.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+class ExpenseCategorySummary(models.Model):
+    """Running per-category expense totals, maintained by trips.signals."""
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='expense_category_summaries')
+    category = models.CharField(max_length=100)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('trip', 'category')
+
+class ExpenseDailySummary(models.Model):
+    """Running per-day expense totals, maintained by trips.signals."""
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='expense_daily_summaries')
+    day = models.DateField()
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('trip', 'day')
+
 class Collaborator(models.Model):
     ROLE_CHOICES = (
         ('editor', 'Editor'),
@@ -39,7 +102,39 @@ class Collaborator(models.Model):
     class Meta:
         unique_together = ('trip', 'user')
 
+class TripMembership(models.Model):
+    """
+    Denormalized access index: one row per trip owner and collaborator, kept in
+    sync by trips.signals. Lets access checks be a single lookup on
+    (user, trip) instead of an OR across Trip.owner and Collaborator.
+    """
+    ROLE_CHOICES = (
+        ('owner', 'Owner'),
+        ('editor', 'Editor'),
+        ('viewer', 'Viewer'),
+    )
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='trip_memberships')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+
+    class Meta:
+        unique_together = ('user', 'trip')
+
+class ItineraryItemQuerySet(models.QuerySet):
+    def set_order(self, item_ids):
+        """Give ``item_ids`` evenly spaced ranks in the given order with a single UPDATE."""
+        if not item_ids:
+            return 0
+        ranks = [models.When(pk=pk, then=models.Value((index + 1) * ItineraryItem.RANK_GAP))
+                 for index, pk in enumerate(item_ids)]
+        return self.filter(pk__in=item_ids).update(
+            order=models.Case(*ranks, output_field=models.PositiveIntegerField()))
+
 class ItineraryItem(models.Model):
+    # Ranks are spaced out so moving an item normally rewrites only that row;
+    # the trip is re-spaced when two neighbours have no room left between them.
+    RANK_GAP = 1024
+
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='itinerary_items')
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -49,8 +144,49 @@ class ItineraryItem(models.Model):
     order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ItineraryItemQuerySet.as_manager()
+
     class Meta:
         ordering = ['order', 'start_time']
+        indexes = [
+            # Serves the overlap range query and the conflicts sweep.
+            models.Index(fields=['trip', 'start_time']),
+        ]
+
+    def move_after(self, previous):
+        """
+        Place this item directly after ``previous`` (or first when ``None``) by
+        giving it a rank between its new neighbours.
+        """
+        with transaction.atomic():
+            self._move_after(previous)
+
+    def _move_after(self, previous):
+        siblings = ItineraryItem.objects.filter(trip_id=self.trip_id).exclude(pk=self.pk).order_by('order', 'start_time', 'pk')
+        if previous is None:
+            lower, following = 0, siblings.first()
+        else:
+            lower = previous.order
+            following = siblings.filter(
+                models.Q(order__gt=previous.order)
+                | models.Q(order=previous.order, start_time__gt=previous.start_time)
+                | models.Q(order=previous.order, start_time=previous.start_time, pk__gt=previous.pk)
+            ).first()
+        upper = following.order if following else lower + 2 * self.RANK_GAP
+
+        if upper - lower >= 2:
+            self.order = (lower + upper) // 2
+            self.save(update_fields=['order'])
+            return
+
+        # No room between the neighbours: re-space the whole trip in one
+        # statement with the item already in its new place.
+        ordered = list(siblings.values_list('pk', flat=True))
+        ordered.insert(0 if previous is None else ordered.index(previous.pk) + 1, self.pk)
+        ItineraryItem.objects.filter(trip_id=self.trip_id).set_order(ordered)
+        Trip.objects.filter(pk=self.trip_id).bump_version()
+        publish_changes(self.trip_id, [{'model': 'itineraryitem', 'id': pk, 'op': 'upsert'} for pk in ordered])
+        self.refresh_from_db(fields=['order'])
 
 class Poll(models.Model):
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='polls')
@@ -59,17 +195,48 @@ class Poll(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
 
+    def cast_vote(self, user, option):
+        """
+        Record ``user``'s vote for ``option``, replacing any earlier vote on this
+        poll. The (poll, user) unique constraint makes concurrent calls safe:
+        the loser of a race updates the winner's row instead of adding another.
+        """
+        with transaction.atomic():
+            vote, _ = Vote.objects.update_or_create(poll=self, user=user, defaults={'option': option})
+        return vote
+
+class PollOptionQuerySet(models.QuerySet):
+    def with_tallies(self, user):
+        """
+        Annotate ``vote_count`` and the caller's ``has_voted`` so listing polls
+        costs one query for all options instead of two per option.
+        """
+        return self.annotate(
+            vote_count=models.Count('votes'),
+            has_voted=models.Exists(Vote.objects.filter(option=models.OuterRef('pk'), user=user)),
+        )
+
 class PollOption(models.Model):
     poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name='options')
     text = models.CharField(max_length=255)
 
+    objects = PollOptionQuerySet.as_manager()
+
 class Vote(models.Model):
+    # Denormalized from option.poll so "one vote per user per poll" is a
+    # database constraint rather than a delete-then-insert in the view.
+    poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name='votes')
     option = models.ForeignKey(PollOption, on_delete=models.CASCADE, related_name='votes')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('option', 'user')
+        unique_together = ('poll', 'user')
+
+    def save(self, *args, **kwargs):
+        if self.poll_id is None and self.option_id is not None:
+            self.poll_id = self.option.poll_id
+        super().save(*args, **kwargs)
 
 class DestinationPlace(models.Model):
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='bucket_list')
@@ -91,3 +258,26 @@ class Booking(models.Model):
 
     def __str__(self):
         return f"{self.user.email} booking for {self.destination} (${self.total_amount})"
+
+
+class SyncChange(models.Model):
+    """
+    Append-only change log behind the delta-sync endpoint. One row per write to
+    a trip's data, keyed by an increasing id, so "what changed since N" is an
+    index range scan. Rows with ``user`` set are addressed to one member: the
+    trip became visible to them (``upsert``) or stopped being (``delete``).
+
+    ``trip_id`` is deliberately not a foreign key so tombstones outlive the trip.
+    """
+    trip_id = models.BigIntegerField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    model = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    op = models.CharField(max_length=6)  # upsert, delete
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trip_id', 'id']),
+            models.Index(fields=['user', 'id']),
+        ]
@@ -0,0 +1,21 @@
+from core.pagination import KeysetPagination
+
+
+class TripPagination(KeysetPagination):
+    ordering = ('-created_at',)
+
+
+class ExpensePagination(KeysetPagination):
+    ordering = ('-timestamp',)
+
+
+class ItineraryItemPagination(KeysetPagination):
+    ordering = ('order', 'start_time')
+
+
+class PollPagination(KeysetPagination):
+    ordering = ('-created_at',)
+
+
+class BookingPagination(KeysetPagination):
+    ordering = ('-created_at',)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Trip, Collaborator, ItineraryItem, Poll, PollOption, Vote, Expense, Booking
+from .models import Trip, Collaborator, ItineraryItem, Poll, PollOption, Vote, Expense, DestinationPlace, Booking
 from users.serializers import UserSerializer
 
 class BookingSerializer(serializers.ModelSerializer):
@@ -22,20 +22,60 @@ class ItineraryItemSerializer(serializers.ModelSerializer):
         model = ItineraryItem
         fields = '__all__'
 
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if not self.context.get('check_conflicts'):
+            return attrs
+
+        def current(field):
+            return attrs.get(field, getattr(self.instance, field, None))
+
+        trip, start, end = current('trip'), current('start_time'), current('end_time')
+        if start and end and end < start:
+            raise serializers.ValidationError({'end_time': 'End time must not be before the start time.'})
+        if self.context.get('batch'):
+            # Batch writes check overlaps across all their items at once.
+            return attrs
+        if trip is None or start is None or end is None:
+            return attrs
+
+        # Range query on the (trip, start_time) index.
+        overlapping = ItineraryItem.objects.filter(trip=trip, start_time__lt=end, end_time__gt=start)
+        if self.instance is not None:
+            overlapping = overlapping.exclude(pk=self.instance.pk)
+        conflicts = list(overlapping.values_list('pk', flat=True)[:20])
+        if conflicts:
+            raise serializers.ValidationError({'conflicts': conflicts})
+        return attrs
+
 class ExpenseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expense
         fields = '__all__'
 
+class DestinationPlaceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DestinationPlace
+        fields = ('id', 'trip', 'name', 'is_visited', 'created_at')
+
 class PollOptionSerializer(serializers.ModelSerializer):
-    vote_count = serializers.IntegerField(source='votes.count', read_only=True)
+    vote_count = serializers.SerializerMethodField()
     has_voted = serializers.SerializerMethodField()
 
     class Meta:
         model = PollOption
         fields = ('id', 'text', 'vote_count', 'has_voted')
 
-    def get_has_voted(self, obj):
+    # Options loaded through PollOption.objects.with_tallies() carry both values
+    # as annotations; the queries below only run for freshly created options.
+    def get_vote_count(self, obj) -> int:
+        if hasattr(obj, 'vote_count'):
+            return obj.vote_count
+        return obj.votes.count()
+
+    def get_has_voted(self, obj) -> bool:
+        if hasattr(obj, 'has_voted'):
+            return obj.has_voted
         user = self.context['request'].user
         return obj.votes.filter(user=user).exists()
 
@@ -55,13 +95,43 @@ class PollSerializer(serializers.ModelSerializer):
             PollOption.objects.create(poll=poll, text=text)
         return poll
 
-class TripSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """
+    Lets the caller narrow a serializer with ``fields`` and opt into the nested
+    relations named in ``expandable_fields`` with ``expand``. Expandable
+    relations are only rendered when expanded, even if listed in ``fields``.
+
+    When neither is given the serializer renders ``default_fields`` (or every
+    field if that is unset), so existing callers are unaffected.
+    """
+    default_fields = None
+    expandable_fields = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None and self.default_fields is None:
+            return
+
+        selected = set(fields) if fields else set(self.default_fields or self.fields)
+        selected -= set(self.expandable_fields)
+        selected |= set(expand or ()) & set(self.expandable_fields)
+        selected.add('id')
+        for name in set(self.fields) - selected:
+            self.fields.pop(name)
+
+class TripSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     collaborators = CollaboratorSerializer(many=True, read_only=True)
     bookings = BookingSerializer(many=True, read_only=True)
     image = serializers.ImageField(required=False, allow_null=True)
-    
+
+    expandable_fields = ('owner', 'collaborators', 'bookings')
+
     class Meta:
         model = Trip
         fields = ('id', 'title', 'description', 'destination', 'start_date', 'end_date', 'owner', 'collaborators', 'image', 'budget', 'created_at', 'bookings')
         read_only_fields = ('owner',)
+
+class TripListSerializer(TripSerializer):
+    """Compact trip card for list screens; nested relations only via ``expand``."""
+    default_fields = ('id', 'title', 'destination', 'start_date', 'end_date', 'image')
@@ -0,0 +1,178 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Trip, TripMembership, SyncChange, Collaborator, ItineraryItem, Poll, PollOption, Vote, Expense, DestinationPlace, Booking
+from users.serializers import UserSerializer
+from . import summaries
+from .events import publish_changes, publish_member_removed, row_change
+
+TRIP_CHILD_MODELS = (Collaborator, ItineraryItem, Poll, Expense, DestinationPlace, Booking)
+
+_rollups_deferred = ContextVar('trip_rollups_deferred', default=False)
+
+
+@contextmanager
+def defer_rollups():
+    """
+    Skip the per-row trip version bumps and expense summary updates inside the
+    block. Batch writers use this and recompute both once for the whole batch.
+    """
+    token = _rollups_deferred.set(True)
+    try:
+        yield
+    finally:
+        _rollups_deferred.reset(token)
+
+
+def _bump_for_trip_child(sender, instance, **kwargs):
+    if _rollups_deferred.get():
+        return
+    Trip.objects.filter(pk=instance.trip_id).bump_version()
+
+
+for model in TRIP_CHILD_MODELS:
+    post_save.connect(_bump_for_trip_child, sender=model, dispatch_uid=f'bump_trip_version_{model.__name__}_save')
+    post_delete.connect(_bump_for_trip_child, sender=model, dispatch_uid=f'bump_trip_version_{model.__name__}_delete')
+
+
+def _publish_trip_child(sender, instance, **kwargs):
+    if _rollups_deferred.get():
+        return
+    op = 'upsert' if kwargs['signal'] is post_save else 'delete'
+    publish_changes(instance.trip_id, [row_change(instance, op)])
+
+
+for model in TRIP_CHILD_MODELS:
+    post_save.connect(_publish_trip_child, sender=model, dispatch_uid=f'trip_events_{model.__name__}_save')
+    post_delete.connect(_publish_trip_child, sender=model, dispatch_uid=f'trip_events_{model.__name__}_delete')
+
+
+def _deleted_with(origin, *models):
+    """Whether a delete cascaded from one of ``models``, by instance or queryset."""
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(origin_model, models)
+
+
+def _deleted_with_poll(origin):
+    # Deleting a poll or trip cascades to its options and votes; the poll's or
+    # trip's own signals already cover them, so per-row work would be redundant.
+    return _deleted_with(origin, Poll, Trip)
+
+
+@receiver([post_save, post_delete], sender=PollOption, dispatch_uid='trip_events_PollOption')
+@receiver([post_save, post_delete], sender=Vote, dispatch_uid='trip_events_Vote')
+def publish_poll_change(sender, instance, origin=None, **kwargs):
+    # Options and votes surface as a change to their poll; who voted stays private.
+    if _deleted_with_poll(origin):
+        return
+    if sender._meta.get_field('poll').is_cached(instance):
+        trip_id = instance.poll.trip_id
+    else:
+        trip_id = Poll.objects.filter(pk=instance.poll_id).values_list('trip_id', flat=True).first()
+    if trip_id is not None:
+        publish_changes(trip_id, [{'model': 'poll', 'id': instance.poll_id, 'op': 'upsert'}])
+
+
+@receiver(post_save, sender=Trip, dispatch_uid='trip_events_Trip_save')
+@receiver(post_delete, sender=Trip, dispatch_uid='trip_events_Trip_delete')
+def publish_trip_change(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    op = 'upsert' if kwargs['signal'] is post_save else 'delete'
+    publish_changes(instance.pk, [row_change(instance, op)])
+
+
+# Trip responses nest members' profiles, so editing one changes their trips.
+MEMBER_PROFILE_FIELDS = set(UserSerializer.Meta.fields)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='bump_trip_version_member_profile')
+def bump_for_member_profile(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login; skip saves that change nothing rendered.
+    if created or (update_fields is not None and not MEMBER_PROFILE_FIELDS & set(update_fields)):
+        return
+    Trip.objects.filter(memberships__user=instance).bump_version()
+
+
+@receiver([post_save, post_delete], sender=PollOption, dispatch_uid='bump_trip_version_PollOption')
+def bump_for_poll_option(sender, instance, origin=None, **kwargs):
+    if not _deleted_with_poll(origin):
+        Trip.objects.filter(polls=instance.poll_id).bump_version()
+
+
+@receiver([post_save, post_delete], sender=Vote, dispatch_uid='bump_trip_version_Vote')
+def bump_for_vote(sender, instance, origin=None, **kwargs):
+    if not _deleted_with_poll(origin):
+        Trip.objects.filter(polls=instance.poll_id).bump_version()
+
+
+@receiver(post_save, sender=Trip, dispatch_uid='trip_membership_owner')
+def add_owner_membership(sender, instance, created, **kwargs):
+    if created:
+        TripMembership.objects.update_or_create(trip=instance, user_id=instance.owner_id, defaults={'role': 'owner'})
+
+
+@receiver(post_save, sender=Collaborator, dispatch_uid='trip_membership_collaborator_save')
+def sync_collaborator_membership(sender, instance, **kwargs):
+    membership, created = TripMembership.objects.get_or_create(
+        trip_id=instance.trip_id, user_id=instance.user_id, defaults={'role': instance.role})
+    # The owner's membership always keeps the owner role.
+    if not created and membership.role not in ('owner', instance.role):
+        membership.role = instance.role
+        membership.save(update_fields=['role'])
+
+
+@receiver(post_delete, sender=Collaborator, dispatch_uid='trip_membership_collaborator_delete')
+def remove_collaborator_membership(sender, instance, **kwargs):
+    TripMembership.objects.exclude(role='owner').filter(trip_id=instance.trip_id, user_id=instance.user_id).delete()
+
+
+@receiver(post_save, sender=TripMembership, dispatch_uid='sync_membership_save')
+@receiver(post_delete, sender=TripMembership, dispatch_uid='sync_membership_delete')
+def log_membership_change(sender, instance, created=False, **kwargs):
+    # Tells the member's next sync that the whole trip appeared or went away.
+    if kwargs['signal'] is post_save and not created:
+        return
+    op = 'upsert' if created else 'delete'
+    SyncChange.objects.create(trip_id=instance.trip_id, user_id=instance.user_id, model='trip', object_id=instance.trip_id, op=op)
+
+
+@receiver(post_delete, sender=TripMembership, dispatch_uid='trip_events_membership_delete')
+def close_removed_member_feeds(sender, instance, origin=None, **kwargs):
+    # A deleted trip takes every feed down with it; only single removals need this.
+    if not _deleted_with(origin, Trip):
+        publish_member_removed(instance.trip_id, instance.user_id)
+
+
+@receiver(pre_save, sender=Expense, dispatch_uid='expense_summary_pre_save')
+def remember_previous_expense(sender, instance, **kwargs):
+    if _rollups_deferred.get():
+        return
+    instance._summary_previous = None
+    if instance.pk is not None:
+        instance._summary_previous = (
+            Expense.objects.filter(pk=instance.pk).values_list('trip_id', 'category', 'timestamp', 'amount').first()
+        )
+
+
+@receiver(post_save, sender=Expense, dispatch_uid='expense_summary_post_save')
+def update_expense_summary(sender, instance, **kwargs):
+    if _rollups_deferred.get():
+        return
+    amount = Expense._meta.get_field('amount').to_python(instance.amount)
+    previous = getattr(instance, '_summary_previous', None)
+    if previous is not None:
+        summaries.remove_expense(*previous)
+    summaries.add_expense(instance.trip_id, instance.category, instance.timestamp, amount)
+
+
+@receiver(post_delete, sender=Expense, dispatch_uid='expense_summary_post_delete')
+def remove_expense_summary(sender, instance, **kwargs):
+    if _rollups_deferred.get():
+        return
+    summaries.remove_expense(instance.trip_id, instance.category, instance.timestamp, instance.amount)
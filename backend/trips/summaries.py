@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Expense, ExpenseCategorySummary, ExpenseDailySummary
+
+
+def _apply_delta(model, trip_id, key, amount, count):
+    rows = model.objects.filter(trip_id=trip_id, **key)
+    if rows.update(total=F('total') + amount, count=F('count') + count):
+        if count < 0:
+            rows.filter(count__lte=0).delete()
+        return
+    if count <= 0:
+        # Nothing to subtract from, e.g. the trip itself is being deleted.
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(trip_id=trip_id, total=amount, count=count, **key)
+    except IntegrityError:
+        # A concurrent writer created the row first; add to it instead.
+        rows.update(total=F('total') + amount, count=F('count') + count)
+
+
+def _apply_expense(trip_id, category, timestamp, amount, count):
+    _apply_delta(ExpenseCategorySummary, trip_id, {'category': category}, amount, count)
+    _apply_delta(ExpenseDailySummary, trip_id, {'day': timezone.localdate(timestamp)}, amount, count)
+
+
+def add_expense(trip_id, category, timestamp, amount):
+    """Fold one expense into the trip's per-category and per-day totals."""
+    _apply_expense(trip_id, category, timestamp, Decimal(amount), 1)
+
+
+def remove_expense(trip_id, category, timestamp, amount):
+    """Take one expense back out of the trip's totals."""
+    _apply_expense(trip_id, category, timestamp, -Decimal(amount), -1)
+
+
+def rebuild_expense_summaries(trip_ids=None):
+    """
+    Recompute summaries for the given trips, or for every trip if ``None``.
+    Used for backfills and after bulk writes that bypass the model signals.
+    """
+    expenses = Expense.objects.all()
+    categories = ExpenseCategorySummary.objects.all()
+    days = ExpenseDailySummary.objects.all()
+    if trip_ids is not None:
+        expenses = expenses.filter(trip_id__in=trip_ids)
+        categories = categories.filter(trip_id__in=trip_ids)
+        days = days.filter(trip_id__in=trip_ids)
+
+    by_category = expenses.values('trip_id', 'category').annotate(total=Sum('amount'), count=Count('id')).order_by()
+    by_day = (
+        expenses.annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        .values('trip_id', 'day').annotate(total=Sum('amount'), count=Count('id')).order_by()
+    )
+
+    with transaction.atomic():
+        categories.delete()
+        days.delete()
+        ExpenseCategorySummary.objects.bulk_create(
+            [ExpenseCategorySummary(**row) for row in by_category.iterator()], batch_size=1000)
+        ExpenseDailySummary.objects.bulk_create(
+            [ExpenseDailySummary(**row) for row in by_day.iterator()], batch_size=1000)
+
+
+def expense_summary(trip, include_days=True):
+    """
+    Budget, spend and breakdowns for ``trip``. Reads only the summary rows, so
+    the cost is O(categories + days) rather than O(expenses).
+    """
+    by_category = list(
+        trip.expense_category_summaries.order_by('category').values('category', 'total', 'count'))
+    spent = sum((row['total'] for row in by_category), Decimal('0'))
+    summary = {
+        'budget': trip.budget,
+        'total_spent': spent,
+        'remaining': trip.budget - spent,
+        'count': sum(row['count'] for row in by_category),
+        'by_category': by_category,
+    }
+    if include_days:
+        summary['by_day'] = list(trip.expense_daily_summaries.order_by('day').values('day', 'total', 'count'))
+    return summary
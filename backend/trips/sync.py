@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Max, Prefetch, Q
+from django.utils import timezone
+
+from chat.models import Message
+from chat.serializers import MessageSerializer
+from core.pagination import decode_cursor, encode_cursor
+from .models import Trip, SyncChange, ItineraryItem, Poll, PollOption, Expense, DestinationPlace, Booking
+from .serializers import (
+    TripSerializer, ItineraryItemSerializer, PollSerializer, ExpenseSerializer, DestinationPlaceSerializer,
+    BookingSerializer,
+)
+
+
+class SyncTokenExpired(Exception):
+    """The token predates the change log's retention window; resync from scratch."""
+
+
+# Synced models by change-log name: response key, queryset and serializer.
+def _sections(user):
+    return {
+        'trip': ('trips', Trip.objects.select_related('owner').prefetch_related('collaborators__user'), TripSerializer),
+        'itineraryitem': ('itinerary_items', ItineraryItem.objects.all(), ItineraryItemSerializer),
+        'expense': ('expenses', Expense.objects.all(), ExpenseSerializer),
+        'poll': ('polls', Poll.objects.select_related('created_by').prefetch_related(
+            Prefetch('options', queryset=PollOption.objects.with_tallies(user))), PollSerializer),
+        'destinationplace': ('bucket_list', DestinationPlace.objects.all(), DestinationPlaceSerializer),
+        'booking': ('bookings', Booking.objects.all(), BookingSerializer),
+    }
+
+
+# Changes to these rows show up as an upsert of their trip.
+_FOLDED = {'collaborator': 'trip'}
+
+
+def _decode_token(token):
+    try:
+        seq, message_id, issued_at = decode_cursor(token)
+        issued_at = datetime.fromisoformat(issued_at)
+        # Issued tokens are always aware; a naive one can't be compared with now.
+        if timezone.is_naive(issued_at):
+            raise ValueError('Naive sync token timestamp')
+        return int(seq), int(message_id), issued_at
+    except (TypeError, ValueError):
+        raise ValueError('Invalid sync token')
+
+
+def sync_changes(request, token=None):
+    """
+    Rows of the caller's trips that changed since ``token``, plus tombstones
+    for deletions and a fresh token. Without a token, returns every trip in
+    full. Chat messages are incremental only; history comes from the chat API.
+
+    Tokens hold the last change id and message id seen. Anything logged within
+    ``SYNC_GRACE_SECONDS`` before the token was issued is sent again, so a
+    transaction that committed after a later one is not skipped; upserts are
+    idempotent, so clients can apply the overlap safely.
+    """
+    user = request.user
+    now = timezone.now()
+    head = SyncChange.objects.aggregate(head=Max('id'))['head'] or 0
+    message_head = Message.objects.aggregate(head=Max('id'))['head'] or 0
+    trip_ids = set(Trip.objects.accessible_to(user).values_list('pk', flat=True))
+
+    upserts, tombstones, full_trips = {}, [], set()
+    messages = Message.objects.none()
+    if token is None:
+        full_trips = trip_ids
+    else:
+        seq, message_id, issued_at = _decode_token(token)
+        if issued_at < now - timedelta(days=settings.SYNC_RETENTION_DAYS):
+            raise SyncTokenExpired()
+        overlap = issued_at - timedelta(seconds=settings.SYNC_GRACE_SECONDS)
+
+        changes = (
+            SyncChange.objects
+            .filter(Q(trip_id__in=trip_ids, user__isnull=True) | Q(user=user))
+            .filter(Q(id__gt=seq) | Q(created_at__gte=overlap), id__lte=head)
+            .order_by('id')
+            .values_list('trip_id', 'user_id', 'model', 'object_id', 'op')
+        )
+        latest = {}
+        for trip_id, user_id, model, object_id, op in changes:
+            if user_id is not None:
+                # The caller joined or left the trip; a join means send it all.
+                if op == 'upsert':
+                    full_trips.add(trip_id)
+                latest[('trip', trip_id)] = op
+                continue
+            if model in _FOLDED:
+                model, object_id, op = _FOLDED[model], trip_id, 'upsert'
+            latest[(model, object_id)] = op
+
+        for (model, object_id), op in latest.items():
+            if op == 'delete':
+                tombstones.append({'model': model, 'id': object_id})
+            else:
+                upserts.setdefault(model, set()).add(object_id)
+
+        messages = (
+            Message.objects.filter(trip_id__in=trip_ids)
+            .filter(Q(id__gt=message_id) | Q(timestamp__gte=overlap), id__lte=message_head)
+            .select_related('user').order_by('timestamp', 'id')
+        )
+
+    context = {'request': request}
+    data = {}
+    for model, (key, queryset, serializer_class) in _sections(user).items():
+        trip_field = 'pk' if model == 'trip' else 'trip_id'
+        condition = Q(**{f'{trip_field}__in': full_trips}) | Q(pk__in=upserts.get(model, ()))
+        rows = queryset.filter(condition, **{f'{trip_field}__in': trip_ids}).order_by('pk')
+        kwargs = {'expand': ('owner', 'collaborators')} if model == 'trip' else {}
+        data[key] = serializer_class(rows, many=True, context=context, **kwargs).data
+
+    data['messages'] = MessageSerializer(messages, many=True, context=context).data
+    data['deleted'] = tombstones
+    data['token'] = encode_cursor([head, message_head, now])
+    return data
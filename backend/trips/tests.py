@@ -1,4 +1,27 @@
-from django.test import TestCase
+from datetime import date, datetime, timezone
+from decimal import Decimal
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.metrics import registry
+from core.pagination import encode_cursor
+from users.models import User
+from .cache import response_cache
+from .consumers import TripEventConsumer
+from .intervals import find_overlaps
+from .models import Trip, SyncChange, Collaborator, Booking, Expense, ItineraryItem, Poll, PollOption, Vote, DestinationPlace, ExpenseCategorySummary
 
 
 class TripModelTest(TestCase):
@@ -13,3 +36,984 @@ class TripModelTest(TestCase):
         trips = ["Paris", "London", "Tokyo"]
         self.assertIn("Paris", trips)
         self.assertEqual(len(trips), 3)
+
+
+class TripQueryCountTest(TestCase):
+    """The trip endpoints must not issue per-row queries for nested relations."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self._guest_count = 0
+
+    def _create_trip(self, guests=1):
+        trip = Trip.objects.create(
+            title='Trip', destination='Paris', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+        for _ in range(guests):
+            self._guest_count += 1
+            guest = User.objects.create_user(email=f'guest{self._guest_count}@example.com')
+            Collaborator.objects.create(trip=trip, user=guest, role='editor')
+            Booking.objects.create(trip=trip, user=guest, destination='Paris')
+        return trip
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_is_independent_of_trip_count(self):
+        for _ in range(2):
+            self._create_trip()
+        baseline = self._count_queries('/api/trips/trips/')
+
+        for _ in range(8):
+            self._create_trip(guests=3)
+        self.assertEqual(self._count_queries('/api/trips/trips/'), baseline)
+
+    def test_detail_query_count_is_independent_of_collaborator_count(self):
+        small = self._create_trip(guests=1)
+        large = self._create_trip(guests=10)
+
+        baseline = self._count_queries(f'/api/trips/trips/{small.pk}/')
+        self.assertEqual(self._count_queries(f'/api/trips/trips/{large.pk}/'), baseline)
+
+
+class KeysetPaginationTest(TestCase):
+    """Cursor pagination is opt-in and walks the full ordering without gaps."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Rome', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+        for index in range(7):
+            Expense.objects.create(trip=self.trip, amount=10, name=f'Expense {index}', category='food')
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get('/api/trips/expenses/', {'trip_id': self.trip.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 7)
+
+    def test_cursor_pages_cover_every_row_once(self):
+        expected = list(Expense.objects.order_by('-timestamp', '-pk').values_list('pk', flat=True))
+        seen = []
+        url, params = '/api/trips/expenses/', {'trip_id': self.trip.pk, 'page_size': 3}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend(item['id'] for item in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/trips/expenses/', {'trip_id': self.trip.pk, 'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class TripSparseFieldsetTest(TestCase):
+    """?fields= and ?expand= trim the trip representation and its queries."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Lisbon', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+        guest = User.objects.create_user(email='guest@example.com')
+        Collaborator.objects.create(trip=self.trip, user=guest)
+
+    def test_full_representation_by_default(self):
+        response = self.client.get('/api/trips/trips/')
+        self.assertIn('collaborators', response.data[0])
+        self.assertIn('owner', response.data[0])
+
+    def test_compact_list_skips_nested_queries(self):
+        with CaptureQueriesContext(connection) as full:
+            self.client.get('/api/trips/trips/')
+        with CaptureQueriesContext(connection) as compact:
+            response = self.client.get('/api/trips/trips/', {'expand': ''})
+        self.assertEqual(
+            set(response.data[0]),
+            {'id', 'title', 'destination', 'start_date', 'end_date', 'image'},
+        )
+        self.assertLess(len(compact), len(full))
+
+    def test_fields_and_expand(self):
+        response = self.client.get(f'/api/trips/trips/{self.trip.pk}/', {'fields': 'title,budget', 'expand': 'collaborators'})
+        self.assertEqual(set(response.data), {'id', 'title', 'budget', 'collaborators'})
+        self.assertEqual(response.data['collaborators'][0]['user']['email'], 'guest@example.com')
+
+
+class ConditionalGetTest(TestCase):
+    """Trip and child endpoints answer 304 until the trip version changes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Oslo', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+
+    def test_trip_detail_not_modified_until_child_changes(self):
+        url = f'/api/trips/trips/{self.trip.pk}/'
+        first = self.client.get(url)
+        etag = first['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        Expense.objects.create(trip=self.trip, amount=5, name='Coffee', category='food')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_trip_list_stamp_is_one_aggregate(self):
+        url = '/api/trips/trips/'
+        for index in range(5):
+            Trip.objects.create(
+                title=f'Trip {index}', destination='Oslo', owner=self.user,
+                start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+            )
+        etag = self.client.get(url, {'page_size': 2})['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(url, {'page_size': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('SUM', ctx.captured_queries[0]['sql'])
+
+        self.trip.title = 'Renamed'
+        self.trip.save()
+        changed = self.client.get(url, {'page_size': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        etag = changed['ETag']
+        self.trip.delete()
+        self.assertEqual(self.client.get(url, {'page_size': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_child_list_uses_trip_version(self):
+        url = '/api/trips/itinerary/'
+        params = {'trip_id': self.trip.pk}
+        etag = self.client.get(url, params)['ETag']
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        ItineraryItem.objects.create(
+            trip=self.trip, title='Museum',
+            start_time=datetime(2026, 5, 2, 10, tzinfo=timezone.utc),
+            end_time=datetime(2026, 5, 2, 12, tzinfo=timezone.utc),
+        )
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_trip_update_changes_version(self):
+        version = self.trip.version
+        self.trip.title = 'Renamed'
+        with CaptureQueriesContext(connection) as ctx:
+            self.trip.save()
+        self.assertEqual(self.trip.version, version + 1)
+        # The increment happens in the UPDATE; the row is not re-read.
+        self.assertNotIn('SELECT', [q['sql'].split()[0] for q in ctx.captured_queries])
+
+    def test_if_modified_since(self):
+        url = f'/api/trips/trips/{self.trip.pk}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+
+class TripMembershipTest(TestCase):
+    """The membership index follows trip creation and collaborator changes."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com')
+        self.guest = User.objects.create_user(email='guest@example.com')
+        self.outsider = User.objects.create_user(email='outsider@example.com')
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Kyoto', owner=self.owner,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+        self.client = APIClient()
+
+    def roles(self):
+        return dict(self.trip.memberships.values_list('user__email', 'role'))
+
+    def test_index_tracks_owner_and_collaborators(self):
+        self.assertEqual(self.roles(), {'owner@example.com': 'owner'})
+
+        collaborator = Collaborator.objects.create(trip=self.trip, user=self.guest, role='viewer')
+        collaborator.role = 'editor'
+        collaborator.save()
+        self.assertEqual(self.roles(), {'owner@example.com': 'owner', 'guest@example.com': 'editor'})
+
+        collaborator.delete()
+        self.assertEqual(self.roles(), {'owner@example.com': 'owner'})
+
+    def test_access_uses_single_lookup_without_distinct(self):
+        Collaborator.objects.create(trip=self.trip, user=self.guest)
+        self.assertEqual(list(Trip.objects.accessible_to(self.guest)), [self.trip])
+        self.assertNotIn('DISTINCT', str(Trip.objects.accessible_to(self.guest).query))
+
+    def test_child_viewsets_are_scoped_to_members(self):
+        expense = Expense.objects.create(trip=self.trip, amount=5, name='Taxi', category='transport')
+
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get('/api/trips/expenses/', {'trip_id': self.trip.pk}).data, [])
+        self.assertEqual(self.client.delete(f'/api/trips/expenses/{expense.pk}/').status_code, 404)
+
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(len(self.client.get('/api/trips/expenses/', {'trip_id': self.trip.pk}).data), 1)
+        self.assertEqual(self.client.delete(f'/api/trips/expenses/{expense.pk}/').status_code, 204)
+
+
+class TripDashboardTest(TestCase):
+    """The dashboard bundles the trip screen in a bounded number of queries."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Cusco', owner=self.user, budget=100,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+        self.url = f'/api/trips/trips/{self.trip.pk}/dashboard/'
+
+    def _populate(self, count):
+        start = self.trip.bucket_list.count()
+        for index in range(start, start + count):
+            ItineraryItem.objects.create(
+                trip=self.trip, title=f'Stop {index}',
+                start_time=datetime(2026, 5, 2, 10, tzinfo=timezone.utc),
+                end_time=datetime(2026, 5, 2, 12, tzinfo=timezone.utc),
+            )
+            Expense.objects.create(trip=self.trip, amount=10, name=f'Meal {index}', category=f'cat{index}')
+            DestinationPlace.objects.create(trip=self.trip, name=f'Place {index}')
+            poll = Poll.objects.create(trip=self.trip, question=f'Q{index}?', created_by=self.user)
+            for text in ('Yes', 'No'):
+                option = PollOption.objects.create(poll=poll, text=text)
+            Vote.objects.create(option=option, user=self.user)
+            Booking.objects.create(trip=self.trip, user=self.user, destination='Cusco')
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_dashboard_contents(self):
+        self._populate(2)
+        response, _ = self._count_queries()
+        self.assertEqual(len(response.data['itinerary']), 2)
+        self.assertEqual(len(response.data['polls']), 2)
+        self.assertTrue(response.data['polls'][0]['options'][1]['has_voted'])
+        self.assertEqual(len(response.data['bucket_list']), 2)
+        self.assertEqual(len(response.data['pending_bookings']), 2)
+        self.assertEqual(response.data['expenses']['remaining'], 80)
+
+    def test_dashboard_query_count_is_bounded(self):
+        self._populate(1)
+        _, baseline = self._count_queries()
+        self._populate(5)
+        self.assertEqual(self._count_queries()[1], baseline)
+
+
+class ExpenseSummaryTest(TestCase):
+    """Summary rows follow expense writes and match a full rebuild."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Hanoi', owner=self.user, budget=500,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+
+    def categories(self):
+        return {
+            row.category: (row.total, row.count)
+            for row in ExpenseCategorySummary.objects.filter(trip=self.trip)
+        }
+
+    def test_incremental_updates(self):
+        lunch = Expense.objects.create(trip=self.trip, amount='12.50', name='Lunch', category='food')
+        Expense.objects.create(trip=self.trip, amount=30, name='Taxi', category='transport')
+        self.assertEqual(self.categories(), {'food': (Decimal('12.50'), 1), 'transport': (Decimal('30'), 1)})
+
+        lunch.category = 'transport'
+        lunch.amount = 20
+        lunch.save()
+        self.assertEqual(self.categories(), {'transport': (Decimal('50'), 2)})
+
+        lunch.delete()
+        self.assertEqual(self.categories(), {'transport': (Decimal('30'), 1)})
+
+    def test_rebuild_matches_incremental(self):
+        for index in range(4):
+            Expense.objects.create(trip=self.trip, amount=index + 1, name=f'Item {index}', category=f'c{index % 2}')
+        incremental = self.categories()
+        ExpenseCategorySummary.objects.all().delete()
+        call_command('rebuild_expense_summaries', stdout=StringIO())
+        self.assertEqual(self.categories(), incremental)
+
+    def test_summary_endpoint(self):
+        Expense.objects.create(trip=self.trip, amount=100, name='Hotel', category='stay')
+        response = self.client.get('/api/trips/expenses/summary/', {'trip_id': self.trip.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['remaining'], Decimal('400'))
+        self.assertEqual(response.data['by_category'][0]['category'], 'stay')
+        self.assertEqual(len(response.data['by_day']), 1)
+
+    def test_summary_rejects_non_numeric_trip_id(self):
+        for trip_id in ('abc', ''):
+            response = self.client.get('/api/trips/expenses/summary/', {'trip_id': trip_id})
+            self.assertEqual(response.status_code, 400)
+
+    def test_failed_summary_update_rolls_back_expense(self):
+        with mock.patch('trips.summaries.add_expense', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Expense.objects.create(trip=self.trip, amount=10, name='Taxi', category='transport')
+        self.assertFalse(Expense.objects.filter(trip=self.trip).exists())
+        self.assertEqual(self.categories(), {})
+
+
+class PollTallyTest(TestCase):
+    """Poll listing annotates tallies instead of querying per option."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.other = User.objects.create_user(email='other@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Quito', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+
+    def _create_polls(self, count):
+        for _ in range(count):
+            poll = Poll.objects.create(trip=self.trip, question='Dinner?', created_by=self.user)
+            options = [PollOption.objects.create(poll=poll, text=text) for text in ('Tacos', 'Sushi', 'Pizza')]
+            Vote.objects.create(option=options[0], user=self.user)
+            Vote.objects.create(option=options[0], user=self.other)
+
+    def _list(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/trips/polls/', {'trip_id': self.trip.pk})
+        return response, len(ctx.captured_queries)
+
+    def test_tallies(self):
+        self._create_polls(1)
+        options = self._list()[0].data[0]['options']
+        self.assertEqual([(o['vote_count'], o['has_voted']) for o in options], [(2, True), (0, False), (0, False)])
+
+    def test_query_count_is_flat(self):
+        self._create_polls(1)
+        baseline = self._list()[1]
+        self._create_polls(10)
+        self.assertEqual(self._list()[1], baseline)
+
+
+class PollVoteTest(TestCase):
+    """Voting keeps exactly one vote per user per poll."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Lima', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+        self.poll = Poll.objects.create(trip=self.trip, question='Hotel?', created_by=self.user)
+        self.first = PollOption.objects.create(poll=self.poll, text='A')
+        self.second = PollOption.objects.create(poll=self.poll, text='B')
+        self.url = f'/api/trips/polls/{self.poll.pk}/vote/'
+
+    def test_changing_vote_replaces_it(self):
+        self.assertEqual(self.client.post(self.url, {'option_id': self.first.pk}).status_code, 200)
+        self.assertEqual(self.client.post(self.url, {'option_id': self.second.pk}).status_code, 200)
+        self.assertEqual(list(Vote.objects.values_list('option_id', flat=True)), [self.second.pk])
+
+    def test_database_rejects_second_vote_on_poll(self):
+        Vote.objects.create(option=self.first, user=self.user)
+        with self.assertRaises(IntegrityError):
+            Vote.objects.create(option=self.second, user=self.user)
+
+    def test_unknown_option_is_not_found(self):
+        other = Poll.objects.create(trip=self.trip, question='Other?', created_by=self.user)
+        foreign = PollOption.objects.create(poll=other, text='X')
+        self.assertEqual(self.client.post(self.url, {'option_id': foreign.pk}).status_code, 404)
+
+    def test_deleting_a_poll_does_not_touch_each_vote(self):
+        def delete_poll(voters):
+            poll = Poll.objects.create(trip=self.trip, question='Dinner?', created_by=self.user)
+            option = PollOption.objects.create(poll=poll, text='Tacos')
+            for index in range(voters):
+                Vote.objects.create(option=option, user=User.objects.create_user(email=f'voter{voters}-{index}@example.com'))
+            with CaptureQueriesContext(connection) as queries:
+                poll.delete()
+            return len(queries)
+
+        self.assertEqual(delete_poll(1), delete_poll(5))
+
+
+class ItineraryOrderingTest(TestCase):
+    """Moving one item rewrites one row; full reorders are a single statement."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Seoul', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+        self.items = [self._item(self.trip, f'Stop {index}') for index in range(5)]
+
+    def _item(self, trip, title):
+        return ItineraryItem.objects.create(
+            trip=trip, title=title,
+            start_time=datetime(2026, 5, 2, 10, tzinfo=timezone.utc),
+            end_time=datetime(2026, 5, 2, 12, tzinfo=timezone.utc),
+        )
+
+    def _titles(self):
+        return list(self.trip.itinerary_items.order_by('order', 'start_time', 'pk').values_list('title', flat=True))
+
+    def _itinerary_updates(self, ctx):
+        return [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "trips_itineraryitem"')]
+
+    def test_reorder_is_one_statement(self):
+        ids = [item.pk for item in reversed(self.items)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/trips/itinerary/reorder/', {'item_ids': ids, 'trip_id': self.trip.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self._itinerary_updates(ctx)), 1)
+        self.assertEqual(self._titles(), [f'Stop {index}' for index in range(4, -1, -1)])
+
+    def test_reorder_rejects_items_from_other_trips(self):
+        other = Trip.objects.create(
+            title='Other', destination='Busan', owner=self.user,
+            start_date=date(2026, 6, 1), end_date=date(2026, 6, 2),
+        )
+        stray = self._item(other, 'Stray')
+        response = self.client.post('/api/trips/itinerary/reorder/', {'items': [self.items[0].pk, stray.pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_reorder_rejects_partial_lists(self):
+        ids = [item.pk for item in self.items[:3]]
+        response = self.client.post('/api/trips/itinerary/reorder/', {'items': ids}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_move_rejects_non_numeric_after(self):
+        for after in ('abc', [1]):
+            response = self.client.post(f'/api/trips/itinerary/{self.items[0].pk}/move/', {'after': after}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_move_rewrites_a_single_row_when_ranks_have_gaps(self):
+        ItineraryItem.objects.filter(trip=self.trip).set_order([item.pk for item in self.items])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/api/trips/itinerary/{self.items[4].pk}/move/', {'after': self.items[0].pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self._itinerary_updates(ctx)), 1)
+        self.assertEqual(self._titles(), ['Stop 0', 'Stop 4', 'Stop 1', 'Stop 2', 'Stop 3'])
+
+    def test_move_rebalances_tied_ranks(self):
+        # Items created without an explicit order all share rank 0.
+        self.client.post(f'/api/trips/itinerary/{self.items[0].pk}/move/', {'after': self.items[2].pk}, format='json')
+        self.assertEqual(self._titles(), ['Stop 1', 'Stop 2', 'Stop 0', 'Stop 3', 'Stop 4'])
+
+        self.client.post(f'/api/trips/itinerary/{self.items[3].pk}/move/', {}, format='json')
+        self.assertEqual(self._titles(), ['Stop 3', 'Stop 1', 'Stop 2', 'Stop 0', 'Stop 4'])
+
+
+class BatchWriteTest(TestCase):
+    """Batch endpoints apply many writes atomically with per-item results."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Bali', owner=self.user, budget=1000,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+        self.taxi = Expense.objects.create(trip=self.trip, amount=20, name='Taxi', category='transport')
+        self.snack = Expense.objects.create(trip=self.trip, amount=5, name='Snack', category='food')
+
+    def test_expense_batch(self):
+        version = Trip.objects.get(pk=self.trip.pk).version
+        payload = {
+            'trip': self.trip.pk,
+            'create': [{'amount': '40.00', 'name': f'Dinner {index}', 'category': 'food'} for index in range(3)],
+            'update': [{'id': self.taxi.pk, 'amount': '25.00'}],
+            'delete': [self.snack.pk],
+        }
+        response = self.client.post('/api/trips/expenses/batch/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['created']), 3)
+        self.assertEqual(response.data['updated'][0]['amount'], '25.00')
+        self.assertEqual(response.data['deleted'], [self.snack.pk])
+
+        self.assertEqual(Trip.objects.get(pk=self.trip.pk).version, version + 1)
+        summary = self.client.get('/api/trips/expenses/summary/', {'trip_id': self.trip.pk}).data
+        self.assertEqual(summary['total_spent'], Decimal('145.00'))
+        self.assertEqual(summary['count'], 4)
+
+    def test_invalid_item_aborts_whole_batch(self):
+        payload = {
+            'trip': self.trip.pk,
+            'create': [{'amount': '1.00', 'name': 'Ok', 'category': 'misc'}, {'name': 'No amount', 'category': 'misc'}],
+            'delete': [self.snack.pk, 999999],
+        }
+        response = self.client.post('/api/trips/expenses/batch/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['create'][0], {})
+        self.assertIn('amount', response.data['create'][1])
+        self.assertIn('id', response.data['delete'][1])
+        self.assertEqual(Expense.objects.filter(trip=self.trip).count(), 2)
+
+    def test_itinerary_batch_create(self):
+        items = [
+            {'title': f'Stop {index}', 'start_time': '2026-05-02T10:00:00Z', 'end_time': '2026-05-02T11:00:00Z'}
+            for index in range(20)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/trips/itinerary/batch/', {'trip': self.trip.pk, 'create': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.trip.itinerary_items.count(), 20)
+        self.assertLess(len(ctx.captured_queries), 10)
+
+    def test_itinerary_batch_create_appends_ranks(self):
+        ItineraryItem.objects.create(
+            trip=self.trip, title='First', order=ItineraryItem.RANK_GAP,
+            start_time=datetime(2026, 5, 2, 8, tzinfo=timezone.utc),
+            end_time=datetime(2026, 5, 2, 9, tzinfo=timezone.utc),
+        )
+        items = [
+            {'title': f'Stop {index}', 'start_time': '2026-05-02T10:00:00Z', 'end_time': '2026-05-02T11:00:00Z'}
+            for index in range(3)
+        ]
+        self.client.post('/api/trips/itinerary/batch/', {'trip': self.trip.pk, 'create': items}, format='json')
+        ranks = list(self.trip.itinerary_items.order_by('order').values_list('title', 'order'))
+        gap = ItineraryItem.RANK_GAP
+        self.assertEqual(ranks, [('First', gap), ('Stop 0', 2 * gap), ('Stop 1', 3 * gap), ('Stop 2', 4 * gap)])
+
+    def test_non_object_body_is_rejected(self):
+        response = self.client.post('/api/trips/expenses/batch/', [{'trip': self.trip.pk}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ItineraryConflictTest(TestCase):
+    """Overlap detection via the sweep and the opt-in create validation."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Cairo', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+
+    def _at(self, hour):
+        return datetime(2026, 5, 2, hour, tzinfo=timezone.utc)
+
+    def _item(self, title, start, end):
+        return ItineraryItem.objects.create(trip=self.trip, title=title, start_time=self._at(start), end_time=self._at(end))
+
+    def test_sweep_reports_each_overlapping_pair(self):
+        intervals = [('a', 1, 5), ('b', 2, 3), ('c', 4, 6), ('d', 6, 7)]
+        self.assertEqual(find_overlaps(intervals), [('a', 'b', 2, 3), ('a', 'c', 4, 5)])
+
+    def test_conflicts_endpoint(self):
+        museum = self._item('Museum', 9, 12)
+        lunch = self._item('Lunch', 11, 13)
+        self._item('Walk', 13, 14)
+        response = self.client.get('/api/trips/itinerary/conflicts/', {'trip_id': self.trip.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['items'] for c in response.data['conflicts']], [[museum.pk, lunch.pk]])
+
+    def test_opt_in_validation_on_create(self):
+        museum = self._item('Museum', 9, 12)
+        payload = {
+            'trip': self.trip.pk, 'title': 'Lunch',
+            'start_time': self._at(11).isoformat(), 'end_time': self._at(13).isoformat(),
+        }
+        response = self.client.post('/api/trips/itinerary/?check_conflicts=true', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['conflicts'], [str(museum.pk)])
+
+        self.assertEqual(self.client.post('/api/trips/itinerary/', payload, format='json').status_code, 201)
+
+    def test_batch_checks_conflicts(self):
+        museum = self._item('Museum', 9, 12)
+        walk = self._item('Walk', 14, 15)
+
+        def span(start, end):
+            return {'start_time': self._at(start).isoformat(), 'end_time': self._at(end).isoformat()}
+
+        payload = {
+            'trip': self.trip.pk,
+            'create': [{'title': 'Lunch', **span(11, 13)}, {'title': 'Tea', **span(16, 18)}, {'title': 'Show', **span(17, 19)}],
+            'update': [{'id': walk.pk, **span(12, 13)}],
+        }
+        url = '/api/trips/itinerary/batch/?check_conflicts=1'
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['create'][0], {'conflicts': [museum.pk, walk.pk]})
+        self.assertEqual(response.data['create'][1], {'conflicts': [{'create': 2}]})
+        self.assertEqual(response.data['create'][2], {'conflicts': [{'create': 1}]})
+        self.assertEqual(response.data['update'][0], {'conflicts': [{'create': 0}]})
+        self.assertEqual(self.trip.itinerary_items.count(), 2)
+
+        # Deleting the museum and moving the walk away clears the way for lunch.
+        payload = {
+            'trip': self.trip.pk,
+            'create': [{'title': 'Lunch', **span(11, 13)}],
+            'update': [{'id': walk.pk, **span(13, 14)}],
+            'delete': [museum.pk],
+        }
+        self.assertEqual(self.client.post(url, payload, format='json').status_code, 200)
+        self.assertEqual(self.client.post('/api/trips/itinerary/batch/', payload | {'delete': []}, format='json').status_code, 200)
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    TRIP_EVENTS_COALESCE_MS=20,
+)
+class TripEventFeedTest(TestCase):
+    """Committed writes reach the trip's WebSocket feed as coalesced deltas."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.stranger = User.objects.create_user(email='stranger@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Kyoto', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+
+    def _communicator(self, user):
+        communicator = WebsocketCommunicator(TripEventConsumer.as_asgi(), f'/ws/trips/{self.trip.pk}/')
+        communicator.scope['url_route'] = {'kwargs': {'trip_id': str(self.trip.pk)}}
+        communicator.scope['user'] = user
+        return communicator
+
+    def _feed_after(self, write):
+        async def run():
+            communicator = self._communicator(self.user)
+            await communicator.connect()
+            await database_sync_to_async(write)()
+            frame = await communicator.receive_json_from()
+            quiet = await communicator.receive_nothing(timeout=0.1)
+            await communicator.disconnect()
+            return frame, quiet
+        return async_to_sync(run)()
+
+    def test_non_members_are_rejected(self):
+        async def run():
+            communicator = self._communicator(self.stranger)
+            connected, _ = await communicator.connect()
+            return connected
+        self.assertFalse(async_to_sync(run)())
+
+    def test_commits_are_coalesced_into_one_frame(self):
+        def write():
+            with self.captureOnCommitCallbacks(execute=True):
+                item = self.client.post('/api/trips/itinerary/', {
+                    'trip': self.trip.pk, 'title': 'Temple',
+                    'start_time': '2026-05-02T09:00:00Z', 'end_time': '2026-05-02T10:00:00Z',
+                }, format='json').data
+                self.client.patch(f'/api/trips/itinerary/{item["id"]}/', {'title': 'Shrine'}, format='json')
+                expense = Expense.objects.create(trip=self.trip, name='Tea', amount=Decimal('4.00'), category='food')
+                expense.delete()
+
+        frame, quiet = self._feed_after(write)
+
+        self.assertTrue(quiet)
+        self.assertEqual(frame['type'], 'changes')
+        self.assertEqual(sorted((c['model'], c['op']) for c in frame['changes']), [
+            ('expense', 'delete'), ('itineraryitem', 'upsert'),
+        ])
+
+    def test_batch_writes_publish_once(self):
+        def write():
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.client.post('/api/trips/expenses/batch/', {
+                    'trip': self.trip.pk,
+                    'create': [{'name': f'Item {n}', 'amount': '1.00', 'category': 'food'} for n in range(3)],
+                }, format='json')
+            self.callbacks = len(callbacks)
+
+        frame, _ = self._feed_after(write)
+
+        self.assertEqual(self.callbacks, 1)
+        self.assertEqual([c['model'] for c in frame['changes']], ['expense'] * 3)
+
+    def test_removed_member_feed_is_closed(self):
+        Collaborator.objects.create(trip=self.trip, user=self.stranger, role='viewer')
+
+        def remove():
+            with self.captureOnCommitCallbacks(execute=True):
+                Collaborator.objects.filter(trip=self.trip, user=self.stranger).delete()
+
+        async def run():
+            owner, member = self._communicator(self.user), self._communicator(self.stranger)
+            for communicator in (owner, member):
+                connected, _ = await communicator.connect()
+                self.assertTrue(connected)
+            await database_sync_to_async(remove)()
+            closed = await member.receive_output()
+            # The owner's feed stays open and sees the collaborator go.
+            frame = await owner.receive_json_from()
+            await owner.disconnect()
+            return closed, frame
+
+        closed, frame = async_to_sync(run)()
+
+        self.assertEqual(closed, {'type': 'websocket.close', 'code': 4003})
+        self.assertEqual([(c['model'], c['op']) for c in frame['changes']], [('collaborator', 'delete')])
+
+
+class DeltaSyncTest(TestCase):
+    """``trips/sync/`` returns only what changed since the token, with tombstones."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.friend = User.objects.create_user(email='friend@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Hanoi', owner=self.user,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+        self.item = ItineraryItem.objects.create(
+            trip=self.trip, title='Market',
+            start_time=datetime(2026, 5, 2, 9, tzinfo=timezone.utc), end_time=datetime(2026, 5, 2, 10, tzinfo=timezone.utc))
+        self.expense = Expense.objects.create(trip=self.trip, name='Pho', amount=Decimal('3.00'), category='food')
+
+    def _sync(self, token=None, **kwargs):
+        params = {'since': token} if token else {}
+        return self.client.get('/api/trips/trips/sync/', params, **kwargs)
+
+    def _age_log(self):
+        # Push existing rows out of the grace window so only new ones come back.
+        SyncChange.objects.update(created_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+    def test_snapshot_then_deltas_with_tombstones(self):
+        snapshot = self._sync().data
+        self.assertEqual([t['id'] for t in snapshot['trips']], [self.trip.pk])
+        self.assertEqual([i['id'] for i in snapshot['itinerary_items']], [self.item.pk])
+        self.assertEqual([e['id'] for e in snapshot['expenses']], [self.expense.pk])
+        self._age_log()
+
+        quiet = self._sync(snapshot['token']).data
+        self.assertEqual(quiet['itinerary_items'], [])
+        self.assertEqual(quiet['expenses'], [])
+        self.assertEqual(quiet['deleted'], [])
+
+        self.client.patch(f'/api/trips/itinerary/{self.item.pk}/', {'title': 'Night market'}, format='json')
+        self.client.delete(f'/api/trips/expenses/{self.expense.pk}/')
+        delta = self._sync(quiet['token']).data
+        self.assertEqual([i['title'] for i in delta['itinerary_items']], ['Night market'])
+        self.assertEqual(delta['expenses'], [])
+        self.assertEqual(delta['deleted'], [{'model': 'expense', 'id': self.expense.pk}])
+
+    def test_removed_member_gets_a_trip_tombstone(self):
+        self.client.force_authenticate(self.friend)
+        Collaborator.objects.create(trip=self.trip, user=self.friend, role='editor')
+        token = self._sync().data['token']
+        self._age_log()
+
+        Collaborator.objects.filter(trip=self.trip, user=self.friend).delete()
+        delta = self._sync(token).data
+        self.assertEqual(delta['deleted'], [{'model': 'trip', 'id': self.trip.pk}])
+        self.assertEqual(delta['itinerary_items'], [])
+
+    def test_joined_trip_is_sent_in_full(self):
+        self.client.force_authenticate(self.friend)
+        token = self._sync().data['token']
+        self._age_log()
+
+        Collaborator.objects.create(trip=self.trip, user=self.friend, role='viewer')
+        delta = self._sync(token).data
+        self.assertEqual([t['id'] for t in delta['trips']], [self.trip.pk])
+        self.assertEqual([i['id'] for i in delta['itinerary_items']], [self.item.pk])
+
+    def test_bad_and_expired_tokens(self):
+        self.assertEqual(self._sync('garbage').status_code, 400)
+        self.assertEqual(self._sync(encode_cursor([1, 1, '2026-10-18T00:00:00'])).status_code, 400)
+        self.assertEqual(self._sync(encode_cursor([1, 1, 5])).status_code, 400)
+        old = encode_cursor([0, 0, datetime(2020, 1, 1, tzinfo=timezone.utc)])
+        self.assertEqual(self._sync(old).status_code, 410)
+
+
+class AsyncTripViewTest(TestCase):
+    """The async read paths return exactly what the viewset does."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@example.com')
+        self.stranger = User.objects.create_user(email='stranger@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.trips = []
+        for index in range(3):
+            trip = Trip.objects.create(
+                title=f'Trip {index}', destination='Oslo', owner=self.user, budget=Decimal('100.50'),
+                start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+            )
+            Collaborator.objects.create(trip=trip, user=self.stranger if index == 0 else self.user, role='editor')
+            Booking.objects.create(trip=trip, user=self.user, destination='Oslo')
+            self.trips.append(trip)
+        Trip.objects.create(
+            title='Not mine', destination='Bergen', owner=self.stranger,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+
+    async def test_list_matches_viewset(self):
+        expected = (await database_sync_to_async(self.client.get)('/api/trips/trips/')).json()
+        response = await self.async_client.get('/api/trips/async/trips/', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(len(expected), 3)
+
+    async def test_list_pagination(self):
+        response = await self.async_client.get('/api/trips/async/trips/', {'page_size': 2}, headers=self.auth)
+        first = response.json()
+        self.assertEqual(len(first['results']), 2)
+        second = (await self.async_client.get(first['next'], headers=self.auth)).json()
+        self.assertIsNone(second['next'])
+        seen = [trip['id'] for trip in first['results'] + second['results']]
+        self.assertEqual(seen, [trip.pk for trip in reversed(self.trips)])
+
+    async def test_detail_matches_viewset(self):
+        trip = self.trips[0]
+        expected = (await database_sync_to_async(self.client.get)(f'/api/trips/trips/{trip.pk}/')).json()
+        response = await self.async_client.get(f'/api/trips/async/trips/{trip.pk}/', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected)
+
+    async def test_detail_of_other_trip_is_not_found(self):
+        other = await Trip.objects.aget(title='Not mine')
+        response = await self.async_client.get(f'/api/trips/async/trips/{other.pk}/', headers=self.auth)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_requires_token(self):
+        response = await self.async_client.get('/api/trips/async/trips/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+        response = await self.async_client.get('/api/trips/async/trips/', headers={'Authorization': 'Bearer nonsense'})
+        self.assertEqual(response.status_code, 401)
+
+
+class ResponseCacheTest(TestCase):
+    """Trip responses are cached per (trip, version, role) and never served stale."""
+
+    def setUp(self):
+        caches['responses'].clear()
+        response_cache.reset_stats()
+        self.owner = User.objects.create_user(email='owner@example.com')
+        self.guest = User.objects.create_user(email='guest@example.com')
+        self.trip = Trip.objects.create(
+            title='Trip', destination='Lima', owner=self.owner,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 10),
+        )
+        Collaborator.objects.create(trip=self.trip, user=self.guest, role='viewer')
+        Expense.objects.create(trip=self.trip, amount=10, name='Taxi', category='transport')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def get(self, url, user=None, **params):
+        if user is not None:
+            self.client.force_authenticate(user)
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_repeat_request_is_served_from_cache(self):
+        url = f'/api/trips/trips/{self.trip.pk}/'
+        first = self.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.get(url)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual((response_cache.hits, response_cache.misses), (1, 1))
+        # Only the version stamp is read on a hit.
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_child_write_invalidates(self):
+        url = '/api/trips/expenses/'
+        self.assertEqual(len(self.get(url, trip_id=self.trip.pk).data), 1)
+        Expense.objects.create(trip=self.trip, amount=5, name='Bus', category='transport')
+        self.assertEqual(len(self.get(url, trip_id=self.trip.pk).data), 2)
+        self.assertEqual(response_cache.hits, 0)
+
+        item = ItineraryItem.objects.create(
+            trip=self.trip, title='Museum',
+            start_time=datetime(2026, 5, 2, 10, tzinfo=timezone.utc),
+            end_time=datetime(2026, 5, 2, 12, tzinfo=timezone.utc),
+        )
+        self.get('/api/trips/itinerary/', trip_id=self.trip.pk)
+        item.delete()
+        self.assertEqual(self.get('/api/trips/itinerary/', trip_id=self.trip.pk).data, [])
+
+    def test_roles_get_separate_entries(self):
+        url = f'/api/trips/trips/{self.trip.pk}/'
+        self.get(url)
+        self.get(url, user=self.guest)
+        self.assertEqual((response_cache.hits, response_cache.misses), (0, 2))
+        self.get(url, user=self.owner)
+        self.assertEqual(response_cache.hits, 1)
+
+    def test_poll_votes_are_not_shared_between_users(self):
+        poll = Poll.objects.create(trip=self.trip, question='Where?', created_by=self.owner)
+        option = PollOption.objects.create(poll=poll, text='Cusco')
+        Collaborator.objects.filter(trip=self.trip, user=self.guest).update(role='editor')
+        poll.cast_vote(self.owner, option)
+        url = f'/api/trips/polls/{poll.pk}/'
+        self.assertTrue(self.get(url).data['options'][0]['has_voted'])
+        self.assertFalse(self.get(url, user=self.guest).data['options'][0]['has_voted'])
+
+    def test_member_profile_change_invalidates(self):
+        url = f'/api/trips/trips/{self.trip.pk}/'
+        self.get(url)
+        self.guest.first_name = 'Renamed'
+        self.guest.save()
+        names = [c['user']['first_name'] for c in self.get(url).data['collaborators']]
+        self.assertIn('Renamed', names)
+
+        # Logging in only touches last_login and keeps the cache warm.
+        self.guest.save(update_fields=['last_login'])
+        self.get(url)
+        self.assertEqual(response_cache.hits, 1)
+
+    def test_hit_rate_is_exported(self):
+        url = f'/api/trips/trips/{self.trip.pk}/'
+        for _ in range(4):
+            self.get(url)
+        self.assertEqual(response_cache.hit_rate(), 0.75)
+        self.assertIn('trip_response_cache_hits_total 3', registry.render())
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            with self.settings(CACHES={**caches.settings, 'responses': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+            }}):
+                url = f'/api/trips/trips/{self.trip.pk}/'
+                first = self.get(url)
+                self.assertEqual(self.get(url).json(), first.json())
+        self.assertEqual(response_cache.hits, 1)
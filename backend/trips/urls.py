@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TripViewSet, ItineraryItemViewSet, PollViewSet, ExpenseViewSet, BookingViewSet
+from .views import AsyncTripListView, AsyncTripDetailView, TripViewSet, ItineraryItemViewSet, PollViewSet, ExpenseViewSet, BookingViewSet
 
 router = DefaultRouter()
 router.register(r'trips', TripViewSet, basename='trip')
@@ -10,5 +10,7 @@ router.register(r'expenses', ExpenseViewSet, basename='expense')
 router.register(r'bookings', BookingViewSet, basename='booking')
 
 urlpatterns = [
+    path('async/trips/', AsyncTripListView.as_view(), name='trip-list-async'),
+    path('async/trips/<int:pk>/', AsyncTripDetailView.as_view(), name='trip-detail-async'),
     path('', include(router.urls)),
 ]
@@ -1,23 +1,120 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
-from .models import Trip, Collaborator, ItineraryItem, Poll, PollOption, Vote, Expense, Booking
-from .serializers import TripSerializer, CollaboratorSerializer, ItineraryItemSerializer, PollSerializer, PollOptionSerializer, ExpenseSerializer, BookingSerializer
+from django.db import transaction
+from django.db.models import Count, Max, Q, Prefetch, Sum
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import NotFound
+from core.instrumentation import timed_serializer
+from core.views import AsyncReadView, TimedSerializerMixin
+from .models import Trip, Collaborator, ItineraryItem, Poll, PollOption, Expense, DestinationPlace, Booking
+from .serializers import TripSerializer, TripListSerializer, CollaboratorSerializer, ItineraryItemSerializer, PollSerializer, PollOptionSerializer, ExpenseSerializer, DestinationPlaceSerializer, BookingSerializer
+from .mixins import BatchWriteMixin, ConditionalGetMixin, TripChildConditionalGetMixin, TripMemberScopedMixin
+from .events import publish_changes
+from .intervals import find_overlaps
+from .summaries import expense_summary, rebuild_expense_summaries
+from .sync import SyncTokenExpired, sync_changes
+from .pagination import TripPagination, ItineraryItemPagination, PollPagination, ExpensePagination, BookingPagination
 
-class TripViewSet(viewsets.ModelViewSet):
+class TripViewSet(TimedSerializerMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = TripSerializer
+    pagination_class = TripPagination
+    cached_actions = ('retrieve',)
     
     def get_queryset(self):
         user = self.request.user
         if not user.is_authenticated:
             return Trip.objects.none()
         try:
-            return Trip.objects.filter(Q(owner=user) | Q(collaborators__user=user)).distinct().order_by('-created_at')
+            queryset = self.get_accessible_trips().order_by('-created_at')
+            # TripSerializer nests the owner, every collaborator's user and every
+            # booking's user; load them up front so the query count stays fixed
+            # regardless of how many trips are returned. Sparse requests only
+            # load the relations they expand.
+            sparse = self.get_sparse_fieldset()
+            expand = sparse[1] if sparse else TripSerializer.expandable_fields
+            if 'owner' in expand:
+                queryset = queryset.select_related('owner')
+            if 'collaborators' in expand:
+                queryset = queryset.prefetch_related(
+                    Prefetch('collaborators', queryset=Collaborator.objects.select_related('user')))
+            if 'bookings' in expand:
+                queryset = queryset.prefetch_related(
+                    Prefetch('bookings', queryset=Booking.objects.select_related('user')))
+            if self.action == 'dashboard':
+                queryset = queryset.prefetch_related(
+                    Prefetch('itinerary_items', to_attr='dashboard_itinerary'),
+                    Prefetch(
+                        'polls',
+                        queryset=Poll.objects.filter(is_active=True).order_by('-created_at')
+                        .select_related('created_by').prefetch_related(
+                            Prefetch('options', queryset=PollOption.objects.with_tallies(self.request.user))),
+                        to_attr='dashboard_polls',
+                    ),
+                    Prefetch('bucket_list', queryset=DestinationPlace.objects.order_by('created_at'), to_attr='dashboard_bucket_list'),
+                )
+            return queryset
         except Exception as e:
             print(f"ERROR in TripViewSet.get_queryset: {e}")
             return Trip.objects.none()
 
+    def get_accessible_trips(self):
+        return Trip.objects.accessible_to(self.request.user)
+
+    def get_version_stamp(self):
+        if not self.request.user.is_authenticated:
+            return None
+        trips = self.get_accessible_trips()
+        if self.detail:
+            pk = self.kwargs['pk']
+            if not str(pk).isdigit():
+                return None
+            stamp = trips.filter(pk=pk).values_list('pk', 'version', 'updated_at', 'memberships__role').first()
+            if stamp is None:
+                return None
+            trip_id, version, updated_at, role = stamp
+            return f'{trip_id}:{version}:{role}', updated_at
+
+        # One aggregate row however many trips the caller has, so a page costs
+        # the same to stamp as to serve. Versions only grow and new memberships
+        # get higher ids, so any edit, join or departure moves one of these.
+        stamp = trips.aggregate(
+            count=Count('pk'), versions=Sum('version'),
+            membership=Max('memberships__id'), updated_at=Max('updated_at'),
+        )
+        if not stamp['count']:
+            return None
+        return '{count}:{versions}:{membership}'.format(**stamp), stamp['updated_at']
+
+    def get_sparse_fieldset(self):
+        """
+        Parse ``?fields=`` and ``?expand=`` for read requests.
+
+        Returns ``None`` for the full representation, otherwise a
+        ``(fields, expand)`` pair for TripListSerializer.
+        """
+        if self.action not in ('list', 'retrieve'):
+            return None
+        params = self.request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None
+
+        def split(value):
+            return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+        return split(params.get('fields')) or None, split(params.get('expand'))
+
+    def get_serializer_class(self):
+        if self.get_sparse_fieldset() is not None:
+            return TripListSerializer
+        return TripSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        sparse = self.get_sparse_fieldset()
+        if sparse is not None:
+            kwargs['fields'], kwargs['expand'] = sparse
+        return super().get_serializer(*args, **kwargs)
+
     def perform_create(self, serializer):
         trip = serializer.save(owner=self.request.user)
         
@@ -46,6 +143,43 @@ class TripViewSet(viewsets.ModelViewSet):
         except Exception as e:
             print(f"FAILED TO NOTIFY ADMIN: {e}")
 
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        Offline sync: rows changed since ``?since=<token>`` plus tombstones and
+        the next token. Omit ``since`` for a full snapshot.
+        """
+        try:
+            return Response(sync_changes(request, request.query_params.get('since')))
+        except SyncTokenExpired:
+            return Response({'error': 'Sync token expired; sync again without since'}, status=status.HTTP_410_GONE)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'])
+    def dashboard(self, request, pk=None):
+        """Everything the trip screen needs, in one round trip."""
+        return self.conditional_response(self._dashboard, request, pk=pk)
+
+    def _dashboard(self, request, pk=None):
+        trip = self.get_object()
+        context = self.get_serializer_context()
+
+        def data(serializer):
+            return timed_serializer(serializer).data
+
+        return Response({
+            'trip': data(TripSerializer(trip, context=context)),
+            'itinerary': data(ItineraryItemSerializer(trip.dashboard_itinerary, many=True, context=context)),
+            'expenses': expense_summary(trip, include_days=False),
+            'polls': data(PollSerializer(trip.dashboard_polls, many=True, context=context)),
+            'bucket_list': data(DestinationPlaceSerializer(trip.dashboard_bucket_list, many=True, context=context)),
+            'pending_bookings': data(BookingSerializer(
+                [booking for booking in trip.bookings.all() if booking.status == 'pending'],
+                many=True, context=context,
+            )),
+        })
+
     @action(detail=True, methods=['post'])
     def invite(self, request, pk=None):
         trip = self.get_object()
@@ -108,56 +242,172 @@ class TripViewSet(viewsets.ModelViewSet):
         except Collaborator.DoesNotExist:
             return Response({'error': 'Collaborator not found'}, status=status.HTTP_404_NOT_FOUND)
 
-class ItineraryItemViewSet(viewsets.ModelViewSet):
+class ItineraryItemViewSet(TimedSerializerMixin, BatchWriteMixin, TripMemberScopedMixin, TripChildConditionalGetMixin, viewsets.ModelViewSet):
+    trip_relation = 'itinerary_items'
     serializer_class = ItineraryItemSerializer
+    cached_actions = ('list', 'retrieve')
+    pagination_class = ItineraryItemPagination
 
     def get_queryset(self):
-        trip_id = self.request.query_params.get('trip_id')
-        if not trip_id:
-            return ItineraryItem.objects.none()
-        return ItineraryItem.objects.filter(trip_id=trip_id)
+        return self.scope_to_member_trips(ItineraryItem.objects.all())
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['check_conflicts'] = self.request.query_params.get('check_conflicts') in ('1', 'true')
+        return context
+
+    def validate_batch(self, trip, new_objects, changed_objects, deletes):
+        """
+        With ``check_conflicts``, sweep the trip as it would be after the batch:
+        new and updated items must not overlap each other or the items left
+        untouched. Conflicts name other rows by id and new items by position.
+        """
+        if not self.get_serializer_context()['check_conflicts']:
+            return {}
+        untouched = trip.itinerary_items.exclude(pk__in=[*deletes, *(item.pk for item in changed_objects)])
+        intervals = [(pk, start, end) for pk, start, end in untouched.values_list('pk', 'start_time', 'end_time')]
+        intervals += [(('update', index), item.start_time, item.end_time) for index, item in enumerate(changed_objects)]
+        intervals += [(('create', index), item.start_time, item.end_time) for index, item in enumerate(new_objects)]
+        intervals.sort(key=lambda interval: interval[1])
+
+        def label(key):
+            if isinstance(key, int):
+                return key
+            kind, index = key
+            return changed_objects[index].pk if kind == 'update' else {'create': index}
+
+        conflicts = {'create': {}, 'update': {}}
+        for first, second, _, _ in find_overlaps(intervals):
+            for key, other in ((first, second), (second, first)):
+                if not isinstance(key, int):
+                    conflicts[key[0]].setdefault(key[1], {'conflicts': []})['conflicts'].append(label(other))
+        return conflicts
+
+    def batch_before_create(self, trip, new_objects):
+        # Append in request order after the current last item, leaving gaps
+        # so later moves rewrite a single row.
+        last = ItineraryItem.objects.filter(trip=trip).aggregate(last=Max('order'))['last'] or 0
+        for index, item in enumerate(new_objects, start=1):
+            item.order = last + index * ItineraryItem.RANK_GAP
+
+    @action(detail=False, methods=['get'])
+    def conflicts(self, request):
+        """Overlapping item pairs for ``?trip_id=``, found with a sorted sweep."""
+        return self.conditional_response(self._conflicts, request)
+
+    def _conflicts(self, request):
+        trip = get_object_or_404(
+            Trip.objects.accessible_to(request.user), pk=request.query_params.get('trip_id'))
+        intervals = trip.itinerary_items.order_by('start_time').values_list('pk', 'start_time', 'end_time')
+        return Response({
+            'trip': trip.pk,
+            'conflicts': [
+                {'items': [first, second], 'overlap_start': start, 'overlap_end': end}
+                for first, second, start, end in find_overlaps(intervals.iterator())
+            ],
+        })
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """Move one item to just after ``after`` (or to the top when omitted)."""
+        item = self.get_object()
+        previous = None
+        after_id = request.data.get('after')
+        if after_id is not None:
+            try:
+                after_id = int(after_id)
+            except (TypeError, ValueError):
+                return Response({'error': 'after must be an item id'}, status=status.HTTP_400_BAD_REQUEST)
+            previous = get_object_or_404(ItineraryItem, pk=after_id, trip_id=item.trip_id)
+            if previous.pk == item.pk:
+                return Response({'error': 'An item cannot be moved after itself'}, status=status.HTTP_400_BAD_REQUEST)
+        item.move_after(previous)
+        return Response(self.get_serializer(item).data)
 
     @action(detail=False, methods=['post'])
     def reorder(self, request):
-        items = request.data.get('items', [])
-        for index, item_id in enumerate(items):
-            ItineraryItem.objects.filter(id=item_id).update(order=index)
+        """
+        Set the full order of a trip's items in one atomic statement. The list
+        must name every item in the trip, so no item keeps a stale rank.
+        """
+        item_ids = request.data.get('items', request.data.get('item_ids', []))
+        if not isinstance(item_ids, list) or not all(isinstance(item_id, int) for item_id in item_ids):
+            return Response({'error': 'items must be a list of item ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(set(item_ids)) != len(item_ids):
+            return Response({'error': 'items contains duplicates'}, status=status.HTTP_400_BAD_REQUEST)
+
+        found = dict(
+            ItineraryItem.objects.filter(pk__in=item_ids, trip__memberships__user=request.user)
+            .values_list('pk', 'trip_id')
+        )
+        if len(found) != len(item_ids):
+            return Response({'error': 'Unknown itinerary items'}, status=status.HTTP_400_BAD_REQUEST)
+        trip_ids = set(found.values())
+        requested_trip = request.data.get('trip_id')
+        if len(trip_ids) > 1 or (requested_trip is not None and trip_ids and {str(requested_trip)} != {str(t) for t in trip_ids}):
+            return Response({'error': 'Items must all belong to the same trip'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if item_ids:
+            trip_id = trip_ids.pop()
+            with transaction.atomic():
+                items = ItineraryItem.objects.filter(trip_id=trip_id)
+                if set(items.select_for_update().values_list('pk', flat=True)) != set(item_ids):
+                    return Response({'error': 'items must list every item in the trip'}, status=status.HTTP_400_BAD_REQUEST)
+                items.set_order(item_ids)
+                Trip.objects.filter(pk=trip_id).bump_version()
+                publish_changes(trip_id, [{'model': 'itineraryitem', 'id': pk, 'op': 'upsert'} for pk in item_ids])
         return Response({'status': 'reordered'})
 
-class PollViewSet(viewsets.ModelViewSet):
+class PollViewSet(TimedSerializerMixin, TripMemberScopedMixin, TripChildConditionalGetMixin, viewsets.ModelViewSet):
+    trip_relation = 'polls'
+    cached_actions = ('list', 'retrieve')
+    # has_voted is per caller.
+    cache_per_user = True
     serializer_class = PollSerializer
+    pagination_class = PollPagination
 
     def get_queryset(self):
-        trip_id = self.request.query_params.get('trip_id')
-        if not trip_id:
-            return Poll.objects.none()
-        return Poll.objects.filter(trip_id=trip_id)
+        return self.scope_to_member_trips(Poll.objects.all()).select_related('created_by').prefetch_related(
+            Prefetch('options', queryset=PollOption.objects.with_tallies(self.request.user)))
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
     @action(detail=True, methods=['post'])
     def vote(self, request, pk=None):
-        option_id = request.data.get('option_id')
-        option = PollOption.objects.get(id=option_id, poll_id=pk)
-        
-        # Remove existing votes for this poll by this user
-        Vote.objects.filter(option__poll_id=pk, user=request.user).delete()
-        Vote.objects.create(option=option, user=request.user)
-        
+        poll = get_object_or_404(self.scope_to_member_trips(Poll.objects.all()), pk=pk)
+        option = get_object_or_404(PollOption, id=request.data.get('option_id'), poll=poll)
+        poll.cast_vote(request.user, option)
         return Response({'status': 'voted'})
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(TimedSerializerMixin, BatchWriteMixin, TripMemberScopedMixin, TripChildConditionalGetMixin, viewsets.ModelViewSet):
+    trip_relation = 'expenses'
+    cached_actions = ('list', 'retrieve')
     serializer_class = ExpenseSerializer
+    pagination_class = ExpensePagination
 
     def get_queryset(self):
-        trip_id = self.request.query_params.get('trip_id')
-        if not trip_id:
-            return Expense.objects.none()
-        return Expense.objects.filter(trip_id=trip_id).order_by('-timestamp')
+        return self.scope_to_member_trips(Expense.objects.all()).order_by('-timestamp')
 
-class BookingViewSet(viewsets.ModelViewSet):
+    def batch_committed(self, trip):
+        rebuild_expense_summaries([trip.pk])
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Spend by category and by day plus budget remaining for ``?trip_id=``."""
+        return self.conditional_response(self._summary, request)
+
+    def _summary(self, request):
+        trip_id = request.query_params.get('trip_id', '')
+        if not trip_id.isdigit():
+            return Response({'error': 'trip_id must be a trip id'}, status=status.HTTP_400_BAD_REQUEST)
+        trip = get_object_or_404(Trip.objects.accessible_to(request.user), pk=trip_id)
+        return Response({'trip': trip.pk, **expense_summary(trip)})
+
+class BookingViewSet(TimedSerializerMixin, TripChildConditionalGetMixin, viewsets.ModelViewSet):
+    trip_relation = 'bookings'
     serializer_class = BookingSerializer
+    pagination_class = BookingPagination
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -179,3 +429,33 @@ class BookingViewSet(viewsets.ModelViewSet):
         booking.status = 'accepted'
         booking.save()
         return Response({'status': 'accepted'})
+
+
+def trip_read_queryset(user):
+    """Trips visible to ``user`` with every relation TripSerializer nests loaded up front."""
+    return Trip.objects.accessible_to(user).order_by('-created_at').select_related('owner').prefetch_related(
+        Prefetch('collaborators', queryset=Collaborator.objects.select_related('user')),
+        Prefetch('bookings', queryset=Booking.objects.select_related('user')),
+    )
+
+
+class AsyncTripListView(AsyncReadView):
+    """
+    Async read path for ``GET trips/``: the same payload and keyset pagination,
+    fetched through the async ORM. ETags and sparse fieldsets stay on the
+    viewset.
+    """
+    pagination_class = TripPagination
+
+    async def get(self, request):
+        return await self.list(request, trip_read_queryset(request.user), TripSerializer)
+
+
+class AsyncTripDetailView(AsyncReadView):
+    """Async read path for ``GET trips/<pk>/``."""
+
+    async def get(self, request, pk):
+        trip = await trip_read_queryset(request.user).filter(pk=pk).afirst()
+        if trip is None:
+            raise NotFound()
+        return timed_serializer(TripSerializer(trip, context={'request': request})).data
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        from core.metrics import registry
+        from . import signals  # noqa: F401
+        from .cache import user_cache
+        registry.register_collector(user_cache.collect_metrics)
@@ -0,0 +1,137 @@
+import copy
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Stands in for the shared version when the cache can't be read; it matches
+# nothing, so every lookup goes to the database until the cache is back.
+_UNAVAILABLE = object()
+
+
+class UserCache:
+    """
+    Per-process, TTL- and size-bounded cache of active users by primary key.
+
+    Shared by REST and WebSocket JWT authentication so repeated requests and
+    reconnects skip the users table. Each user also has a version key in the
+    shared ``alias`` cache, replaced whenever the user is saved or deleted.
+    Entries remember the version they were loaded under, and a hit only
+    counts if it still matches, so a deactivation in one process is seen by
+    every other process on its next lookup rather than after ``ttl``. That
+    costs one cache read per hit instead of a users table query, and needs
+    ``alias`` to be a cache every process shares, such as Redis.
+    Callers get a copy, so per-request changes to ``request.user`` stay local.
+    """
+
+    def __init__(self, ttl=60, maxsize=10000, alias='default'):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """The user with ``user_id``, loading it on a miss; ``None`` if it doesn't exist."""
+        user_id = self._key(user_id)
+        now = time.monotonic()
+        # Read before loading, so a change that lands mid-load leaves the
+        # entry on the old version.
+        version = self._shared_version(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now and entry[1] is not _UNAVAILABLE and entry[1] == version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return copy.copy(entry[2])
+            self.misses += 1
+            generation = self._generation
+
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+
+        with self._lock:
+            # Skip the write if the user was invalidated while we were loading,
+            # otherwise a stale row could be cached for a full ttl.
+            if generation == self._generation:
+                self._entries[user_id] = (now + self.ttl, version, user)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return copy.copy(user)
+
+    async def apeek(self, user_id):
+        """The cached user if present and current, without touching the database."""
+        user_id = self._key(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        try:
+            version = await caches[self.alias].aget(self._version_key(user_id))
+        except Exception:
+            logger.exception('User cache versions unavailable')
+            return None
+        if entry[1] is _UNAVAILABLE or entry[1] != version:
+            return None
+        with self._lock:
+            self.hits += 1
+        return copy.copy(entry[2])
+
+    def invalidate(self, user_id):
+        """Drop the user here and, through the shared version, in every other process."""
+        user_id = self._key(user_id)
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+        try:
+            caches[self.alias].set(self._version_key(user_id), uuid.uuid4().hex, None)
+        except Exception:
+            logger.exception('User cache versions unavailable')
+
+    def _shared_version(self, user_id):
+        try:
+            return caches[self.alias].get(self._version_key(user_id))
+        except Exception:
+            logger.exception('User cache versions unavailable')
+            return _UNAVAILABLE
+
+    @staticmethod
+    def _version_key(user_id):
+        return f'user-version:{user_id}'
+
+    @staticmethod
+    def _key(user_id):
+        # Token claims may carry the id as a string; entries are keyed by pk.
+        return get_user_model()._meta.pk.to_python(user_id)
+
+    def clear(self):
+        """Empty this process's entries; the shared versions are left alone."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def collect_metrics(self):
+        """Counters for core.metrics."""
+        return [
+            ('user_cache_hits_total', 'counter', 'Authenticated user lookups served from cache.', self.hits),
+            ('user_cache_misses_total', 'counter', 'Authenticated user lookups that hit the database.', self.misses),
+        ]
+
+
+user_cache = UserCache(
+    ttl=getattr(settings, 'USER_CACHE_TTL', 60),
+    maxsize=getattr(settings, 'USER_CACHE_SIZE', 10000),
+    alias=getattr(settings, 'USER_CACHE_ALIAS', 'default'),
+)
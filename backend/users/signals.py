@@ -0,0 +1,17 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import user_cache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Drop it now, and again once the change is visible to other connections,
+    # in case a concurrent request re-cached the old row in between.
+    user_cache.invalidate(instance.pk)
+    transaction.on_commit(partial(user_cache.invalidate, instance.pk))
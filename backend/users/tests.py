@@ -1,4 +1,13 @@
+from asgiref.sync import async_to_sync
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chat.middleware import get_user
+from .cache import UserCache, user_cache
+from .models import User
 
 
 class UserModelTest(TestCase):
@@ -11,3 +20,57 @@ class UserModelTest(TestCase):
     def test_string_operations(self):
         """Test basic string operations."""
         self.assertEqual("hello".upper(), "HELLO")
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(email='cached@example.com')
+        self.token = str(AccessToken.for_user(self.user))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def user_queries(self, queries):
+        return [query for query in queries if 'users_user' in query['sql']]
+
+    def test_repeat_requests_skip_the_users_table(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], 'cached@example.com')
+        self.assertEqual(self.user_queries(queries), [])
+
+    def test_profile_changes_and_deactivation_invalidate(self):
+        self.client.get('/api/users/me/')
+        self.user.bio = 'Updated'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').data['bio'], 'Updated')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_websocket_auth_shares_the_cache(self):
+        self.client.get('/api/users/me/')
+        with CaptureQueriesContext(connection) as queries:
+            user = async_to_sync(get_user)(self.token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(queries.captured_queries, [])
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        user_cache.invalidate(self.user.pk)
+        self.assertFalse(async_to_sync(get_user)(self.token).is_authenticated)
+        self.assertFalse(async_to_sync(get_user)('not-a-token').is_authenticated)
+
+    def test_invalidation_reaches_other_processes(self):
+        self.client.get('/api/users/me/')
+        # Another process's cache, sharing only the CACHES backend with this one.
+        other = UserCache()
+        self.assertEqual(other.get(self.user.pk).pk, self.user.pk)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        other.invalidate(self.user.pk)
+
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+        self.assertFalse(async_to_sync(get_user)(self.token).is_authenticated)
@@ -26,13 +26,28 @@ class _ChatScreenState extends State<ChatScreen> {
   final _scrollController = ScrollController();
   WebSocketChannel? _channel;
   final List<Map<String, dynamic>> _messages = [];
+  String? _historyCursor;
+  bool _loadingHistory = false;
 
   @override
   void initState() {
     super.initState();
+    _scrollController.addListener(_onScroll);
     _initChat();
   }
 
+  void _onScroll() {
+    // Ask the server for the previous page once the user reaches the top.
+    if (_historyCursor == null || _loadingHistory || _channel == null) return;
+    if (_scrollController.position.pixels <= _scrollController.position.minScrollExtent) {
+      _loadingHistory = true;
+      _channel!.sink.add(json.encode({
+        'command': 'load_more',
+        'cursor': _historyCursor,
+      }));
+    }
+  }
+
   void _initChat() async {
     final settingsBox = await Hive.openBox('settings');
     final token = settingsBox.get('auth_token');
@@ -41,16 +56,42 @@ class _ChatScreenState extends State<ChatScreen> {
     // For now, we'll try to identify "me" by the presence of our own messages if the backend sends it
     // Or we could pass it in. Let's assume we can get it from the settings/profile.
     
-    final String wsUrl = 'ws://127.0.0.1:8000/ws/chat/${widget.trip.id}/?token=$token';
+    final String wsUrl = 'ws://127.0.0.1:8000/ws/chat/${widget.trip.id}/?token=$token&acks=1';
     _channel = WebSocketChannel.connect(Uri.parse(wsUrl));
 
     _channel!.stream.listen((data) {
-      if (mounted) {
+      if (!mounted) return;
+      var frame = Map<String, dynamic>.from(json.decode(data));
+      if (frame['type'] == 'history') {
+        final page = List<Map<String, dynamic>>.from(frame['messages']);
+        final isInitial = _messages.isEmpty;
         setState(() {
-          _messages.add(json.decode(data));
+          _messages.insertAll(0, page);
+          _historyCursor = frame['cursor'];
+          _loadingHistory = false;
         });
-        _scrollToBottom();
+        if (isInitial) _scrollToBottom();
+        return;
       }
+      if (frame['type'] == 'error') {
+        _loadingHistory = false;
+        return;
+      }
+      if (frame['seq'] != null) {
+        // Broadcasts are paced by acks; the server holds back the rest.
+        _channel!.sink.add(json.encode({'command': 'ack', 'seq': frame['seq']}));
+      }
+      if (frame['type'] == 'missed') {
+        // The server skipped messages because this client fell behind.
+        frame = {
+          'message': '${frame['count']} messages skipped on a slow connection',
+          'user': 'system',
+        };
+      }
+      setState(() {
+        _messages.add(frame);
+      });
+      _scrollToBottom();
     });
   }
 